@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pgeocode
+
+from src.app.geocoding import COUNTRY_ALIASES, DEFAULT_POSTAL_INDEX_DIR, normalize_postal_code
+
+# Ziel-Ordner (memory-mapped PLZ-Index für src/app/geocoding.py)
+OUT_DIR = str(DEFAULT_POSTAL_INDEX_DIR)
+
+# Alle Länder, die normalize_country_for_pgeocode liefern kann (+ DE als Default)
+DEFAULT_COUNTRIES = sorted(set(COUNTRY_ALIASES.values()) | {"DE"})
+
+
+def load_country(cc: str) -> pd.DataFrame:
+    """Lädt die (eindeutigen) PLZ eines Landes über pgeocode (Download beim ersten Mal)"""
+    geo = pgeocode.Nominatim(cc)
+    data = geo._data_frame[["postal_code", "latitude", "longitude"]]
+    data = data.dropna(subset=["postal_code", "latitude", "longitude"])
+
+    codes = data["postal_code"].astype(str).map(lambda c: normalize_postal_code(cc, c))
+    out = pd.DataFrame({
+        "key": cc + codes,
+        "lat": data["latitude"].astype("float64").to_numpy(),
+        "lon": data["longitude"].astype("float64").to_numpy(),
+    })
+    # GB/IE/CA: mehrere PLZ fallen auf denselben Outward-Code -> mitteln
+    return out.groupby("key", as_index=False)[["lat", "lon"]].mean()
+
+
+def build_index(countries, out_dir: str):
+    frames = []
+    for cc in countries:
+        print(f"Lade PLZ-Daten {cc}...")
+        df = load_country(cc)
+        print(f"   {cc}: {len(df)} PLZ")
+        frames.append(df)
+
+    table = pd.concat(frames, ignore_index=True).sort_values("key", kind="stable")
+    keys = table["key"].str.encode("utf-8").to_numpy()
+    width = max(len(k) for k in keys)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "keys.npy"), np.array(keys, dtype=f"S{width}"))
+    np.save(os.path.join(out_dir, "lat.npy"), table["lat"].to_numpy(dtype="float64"))
+    np.save(os.path.join(out_dir, "lon.npy"), table["lon"].to_numpy(dtype="float64"))
+
+    built = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    meta = {
+        "version": f"pgeocode-{pgeocode.__version__}:{built}",
+        "countries": list(countries),
+        "entries": int(len(table)),
+        "key_width": int(width),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Baut den Offline-PLZ-Index unter assets/postal_index")
+    parser.add_argument("--countries", help="Kommagetrennte ISO2-Codes (Default: alle aus COUNTRY_ALIASES)")
+    parser.add_argument("--all", action="store_true", help="Alle von pgeocode unterstützten Länder")
+    parser.add_argument("--out", default=OUT_DIR, help=f"Zielordner (Default: {OUT_DIR})")
+    args = parser.parse_args()
+
+    if args.all:
+        countries = list(pgeocode.COUNTRIES_VALID)
+    elif args.countries:
+        countries = sorted({c.strip().upper() for c in args.countries.split(",") if c.strip()})
+    else:
+        countries = DEFAULT_COUNTRIES
+
+    invalid = [c for c in countries if c not in pgeocode.COUNTRIES_VALID]
+    if invalid:
+        sys.exit(f"Unbekannte Ländercodes: {invalid}")
+
+    meta = build_index(countries, args.out)
+    print(f"✅ Fertig: {args.out}")
+    print(f"Einträge: {meta['entries']} | Länder: {', '.join(meta['countries'])}")
+
+if __name__ == "__main__":
+    main()
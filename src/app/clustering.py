@@ -0,0 +1,256 @@
+"""
+Cluster-Hierarchie - Projekte pro Zoomstufe auf ein Pixel-Raster (Web Mercator) verdichten
+Zelle (z, cx, cy) liegt vollständig in Zelle (z-1, cx//2, cy//2): die Stufen
+bilden einen Baum. Pro Zelle und Kategorie entsteht ein Cluster mit Schwerpunkt,
+Gesamtzahl und Anzahlen je (Art, Status, Land) - daraus lassen sich im Browser
+gefilterte Zahlen und Anteile berechnen, ohne die einzelnen Projekte zu kennen.
+
+Ausgabe (export_hierarchy): die Stufen bis zum Start-Zoom als Dict zum Einbetten
+(Größe hängt von der Fläche ab, nicht von der Projektanzahl), feinere Stufen
+ebenfalls, solange sie ins Budget EMBED_MAX_ROWS passen. Erst die Stufen
+darüber und die einzelnen Projekte werden JSONP-Blöcke zum Nachladen
+(funktioniert auch über file://).
+"""
+
+import json
+import math
+import shutil
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+TILE_SIZE = 256          # Leaflet/Web-Mercator-Kachel in Pixeln
+DEFAULT_CELL_PX = 60     # Rasterweite (Pixel) auf jeder Zoomstufe
+BLOCK_PX = 1024          # Nachladen in Blöcken von 4x4 Kacheln
+EMBED_MAX_ROWS = 5000    # zusätzlich eingebettete Zeilen (~300 KB), erst darüber Blöcke
+
+# Werte, die pro Cluster gezählt werden (Kategorie trennt die Cluster selbst)
+GROUP_FIELDS = ["plant", "status", "country"]
+VALUE_FIELDS = ["category"] + GROUP_FIELDS
+POINT_FIELDS = ["id", "name", "vn", "kunde", "plz"]
+
+BLOCK_CALLBACK = "projectBlockLoaded"
+
+# Markierung im Block-Ordner: nur so markierte Ordner werden beim Export gelöscht
+MANIFEST_NAME = "hierarchy.json"
+
+
+def world_px(lat, lon, z: int):
+    """Web-Mercator-Pixelkoordinaten auf Zoomstufe z (wie Leaflet project())"""
+    scale = TILE_SIZE * 2.0 ** z
+    lat = np.clip(np.asarray(lat, dtype="float64"), -85.05112878, 85.05112878)
+    x = (np.asarray(lon, dtype="float64") + 180.0) / 360.0 * scale
+    s = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def fit_zoom(bounds, width: int = 1280, height: int = 800) -> int:
+    """
+    Zoomstufe, auf der Leaflet fit_bounds für einen Viewport dieser Größe landet
+
+    Args:
+        bounds: [[south, west], [north, east]]
+    """
+    (south, west), (north, east) = bounds
+    for z in range(18, -1, -1):
+        x, y = world_px([north, south], [west, east], z)
+        if x[1] - x[0] <= width and y[1] - y[0] <= height:
+            return z
+    return 0
+
+
+def build_hierarchy(records: Iterable[dict], max_zoom: int, min_zoom: int = 0,
+                    cell_px: int = DEFAULT_CELL_PX) -> dict:
+    """
+    Baut die Cluster-Hierarchie über alle Zoomstufen
+
+    Args:
+        records: Projekt-Dicts (iter_project_records: category, plant, status,
+                 country, lat, lon, ...)
+        max_zoom: letzte geclusterte Stufe, darüber werden Einzelprojekte gezeigt
+        min_zoom: erste Stufe
+        cell_px: Rasterweite in Pixeln
+
+    Returns:
+        {"min_zoom", "max_zoom", "cell_px", "values": {Feld: [Werte]},
+         "levels": {z: DataFrame}, "points": DataFrame}
+        levels: eine Zeile pro Cluster (cx, cy, category, lat, lon, count, groups)
+        mit groups = Array [[plant, status, country, n], ...] (Indizes in values)
+    """
+    df = pd.DataFrame.from_records(list(records))
+    if df.empty:
+        df = pd.DataFrame(columns=VALUE_FIELDS + POINT_FIELDS + ["lat", "lon"])
+
+    # Wenige verschiedene Werte -> Index in eine Werteliste (wie project_data_payload)
+    values = {}
+    for f in VALUE_FIELDS:
+        codes, uniques = pd.factorize(df[f].astype(str))
+        df[f] = codes
+        values[f] = [str(v) for v in uniques]
+
+    levels = {}
+    for z in range(min_zoom, max_zoom + 1):
+        x, y = world_px(df["lat"], df["lon"], z)
+        cells = df[VALUE_FIELDS + ["lat", "lon"]].assign(
+            cx=np.floor(x / cell_px).astype("int64"),
+            cy=np.floor(y / cell_px).astype("int64"),
+        )
+        keys = ["cx", "cy", "category"]
+        centers = cells.groupby(keys, sort=True).agg(
+            lat=("lat", "mean"), lon=("lon", "mean"), count=("lat", "size")
+        )
+        # Gleiche Sortierung wie centers -> Blockgrenzen statt groupby().apply pro Cluster
+        joint = cells.groupby(keys + GROUP_FIELDS, sort=True).size().reset_index(name="n")
+        starts = np.flatnonzero(joint[keys].ne(joint[keys].shift()).any(axis=1).to_numpy())
+        groups = np.split(joint[GROUP_FIELDS + ["n"]].to_numpy(dtype="int64"), starts[1:])
+        level = centers.reset_index()
+        level["groups"] = groups if len(level) else []
+        levels[z] = level
+
+    return {
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "cell_px": cell_px,
+        "values": values,
+        "levels": levels,
+        "points": df,
+    }
+
+
+def cluster_rows(level: pd.DataFrame) -> list:
+    """[lat, lon, category, count, [plant, status, country, n, ...]] pro Cluster"""
+    return [
+        [round(lat, 5), round(lon, 5), int(cat), int(n), groups.ravel().tolist()]
+        for lat, lon, cat, n, groups in zip(
+            level["lat"], level["lon"], level["category"], level["count"], level["groups"]
+        )
+    ]
+
+
+def point_rows(points: pd.DataFrame) -> list:
+    """[category, plant, status, country, id, name, vn, kunde, plz, lat, lon] pro Projekt"""
+    cols = [points[f] for f in VALUE_FIELDS] + [points[f] for f in POINT_FIELDS]
+    return [
+        [int(c), int(p), int(s), int(k), *(str(v) for v in texts), round(lat, 6), round(lon, 6)]
+        for c, p, s, k, *texts, lat, lon in zip(*cols, points["lat"], points["lon"])
+    ]
+
+
+def _blocks(lat, lon, z: int):
+    x, y = world_px(lat, lon, z)
+    return np.floor(x / BLOCK_PX).astype("int64"), np.floor(y / BLOCK_PX).astype("int64")
+
+
+def _write_block(out_dir: Path, z: int, bx: int, by: int, rows: list) -> None:
+    path = out_dir / str(z) / f"{bx}_{by}.js"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"window.{BLOCK_CALLBACK}({z},{bx},{by},{data});\n")
+
+
+def _write_manifest(out_dir: Path, manifest: dict) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def _clear_blocks(out_dir: Path) -> None:
+    """Entfernt einen früheren Export - aber nur, wenn er das Manifest trägt"""
+    if not out_dir.exists():
+        return
+    if (out_dir / MANIFEST_NAME).exists():
+        shutil.rmtree(out_dir)
+    elif any(out_dir.iterdir()):
+        raise FileExistsError(
+            f"{out_dir} existiert, stammt aber nicht von export_hierarchy "
+            f"(kein {MANIFEST_NAME}) - bitte verschieben oder OUT_HTML ändern"
+        )
+
+
+def export_hierarchy(hierarchy: dict, initial_zoom: int, out_dir: Optional[Path],
+                     embed_rows: int = EMBED_MAX_ROWS) -> dict:
+    """
+    Teilt die Hierarchie in Einbettung und Nachlade-Blöcke
+
+    Stufen <= initial_zoom landen immer im Rückgabewert, die feineren Stufen
+    bis zu den Einzelprojekten (Stufe max_zoom + 1) ebenfalls, solange
+    zusammen höchstens embed_rows Zeilen dazukommen. Erst die Stufen danach
+    werden als <out_dir>/<z>/<bx>_<by>.js geschrieben - bei wenigen Projekten
+    entfallen die Blöcke (und ihre Requests) ganz. Ein vorhandenes out_dir
+    wird nur ersetzt, wenn es MANIFEST_NAME enthält.
+
+    Returns:
+        {"minZoom", "maxZoom", "initialZoom", "embedZoom", "blockPx", "values",
+         "levels": {z: rows}, "blocks": Anzahl geschriebener Blöcke}
+        embedZoom: letzte eingebettete Stufe
+    """
+    min_zoom, max_zoom = hierarchy["min_zoom"], hierarchy["max_zoom"]
+    initial_zoom = max(min_zoom, min(initial_zoom, max_zoom))
+
+    stages = [(z, level, cluster_rows) for z, level in hierarchy["levels"].items()]
+    stages.append((max_zoom + 1, hierarchy["points"], point_rows))
+
+    # Zeilenzahl wächst mit der Stufe -> eingebettet wird immer ein Präfix
+    embedded, budget, embed_zoom = {}, embed_rows, initial_zoom
+    for z, frame, to_rows in stages:
+        if z > initial_zoom:
+            if len(frame) > budget:
+                break
+            budget -= len(frame)
+            embed_zoom = z
+        embedded[z] = to_rows(frame)
+
+    n_blocks = 0
+    lazy = [(z, frame, to_rows) for z, frame, to_rows in stages if z > embed_zoom and len(frame)]
+    if out_dir is not None:
+        _clear_blocks(out_dir)
+    if out_dir is not None and lazy:
+        # Manifest vor dem ersten Block: auch ein abgebrochener Export gilt als eigener Ordner
+        _write_manifest(out_dir, {"embedZoom": embed_zoom, "blocks": None, "complete": False})
+        for z, frame, to_rows in lazy:
+            bx, by = _blocks(frame["lat"], frame["lon"], z)
+            for (x, y), part in frame.groupby([bx, by], sort=True):
+                _write_block(out_dir, z, int(x), int(y), to_rows(part))
+                n_blocks += 1
+        _write_manifest(out_dir, {"embedZoom": embed_zoom, "blocks": n_blocks, "complete": True})
+
+    return {
+        "minZoom": min_zoom,
+        "maxZoom": max_zoom,
+        "initialZoom": initial_zoom,
+        "embedZoom": embed_zoom,
+        "blockPx": BLOCK_PX,
+        "values": hierarchy["values"],
+        "levels": embedded,
+        "blocks": n_blocks,
+    }
+
+
+def level_summary(hierarchy: dict) -> list:
+    """(Zoom, Anzahl Cluster, größter Cluster) pro Stufe - für Ausgaben/Debugging"""
+    return [
+        (z, len(level), int(level["count"].max()) if len(level) else 0)
+        for z, level in hierarchy["levels"].items()
+    ]
+
+
+# Für Debugging: Hierarchie für zufällige Punkte in Deutschland
+if __name__ == '__main__':
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = np.random.default_rng(0)
+    recs = [
+        {"id": f"proj-{i}", "category": rng.choice(["EZA", "EZAR", "OSNV", "EZE"]),
+         "plant": rng.choice(["PV", "Wind", "BHKW"]), "status": rng.choice(["Angebot", "Auftrag"]),
+         "country": "DE", "name": f"Projekt {i}", "vn": str(i), "kunde": "", "plz": "",
+         "lat": rng.uniform(47.3, 55.0), "lon": rng.uniform(5.9, 15.0)}
+        for i in range(n)
+    ]
+    h = build_hierarchy(recs, max_zoom=12)
+    for z, clusters, biggest in level_summary(h):
+        print(f"   z{z:>2}: {clusters:>6} Cluster (max {biggest})")
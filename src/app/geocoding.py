@@ -0,0 +1,443 @@
+"""
+Geocoding - PLZ -> Koordinaten (pgeocode) mit persistentem Cache
+Bereits aufgelöste (Land, PLZ)-Paare landen in einer lokalen SQLite-Datei,
+damit nur unbekannte Codes bei pgeocode abgefragt werden.
+Ist der Offline-Index (assets/postal_index, siehe build_postal_index.py)
+vorhanden, wird er bevorzugt - dann ist kein Netzwerk nötig. Länder außerhalb
+des Index bleiben dann unaufgelöst, außer GEOCODE_ONLINE_FALLBACK=True.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pgeocode
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_PATH = PROJECT_ROOT / ".cache" / "geocode_cache.sqlite"
+DEFAULT_POSTAL_INDEX_DIR = PROJECT_ROOT / "assets" / "postal_index"
+
+# Freitext-Ländernamen (Spalte "Land") -> ISO2-Code für pgeocode
+COUNTRY_ALIASES = {
+    "de": "DE", "deu": "DE", "germany": "DE", "deutschland": "DE",
+    "at": "AT", "aut": "AT", "austria": "AT", "österreich": "AT", "osterreich": "AT",
+    "ch": "CH", "che": "CH", "switzerland": "CH", "schweiz": "CH",
+    "nl": "NL", "nld": "NL", "netherlands": "NL", "holland": "NL",
+    "be": "BE", "belgium": "BE", "belgien": "BE",
+    "fr": "FR", "france": "FR", "frankreich": "FR",
+    "pl": "PL", "poland": "PL", "polen": "PL",
+    "cz": "CZ", "czechia": "CZ", "tschechien": "CZ",
+    "dk": "DK", "denmark": "DK", "dänemark": "DK", "danemark": "DK",
+    "se": "SE", "sweden": "SE", "schweden": "SE",
+    "no": "NO", "norway": "NO", "norwegen": "NO",
+    "es": "ES", "spain": "ES", "spanien": "ES",
+    "pt": "PT", "portugal": "PT",
+    "it": "IT", "italy": "IT", "italien": "IT",
+}
+
+# Prozessweite pgeocode-Instanzen: {cc: (dataset_version, Nominatim)}
+_NOMINATIM_REGISTRY = {}
+_NOMINATIM_LOCK = threading.Lock()
+
+# Länder ohne Index-Abdeckung, für die schon gewarnt wurde
+_UNCOVERED_WARNED = set()
+
+
+def cache_enabled() -> bool:
+    """GEOCODE_CACHE aus .env (Default: an)"""
+    return os.getenv('GEOCODE_CACHE', 'True').strip().lower() not in {'false', '0', 'no', 'nein', 'off'}
+
+
+def online_fallback_enabled() -> bool:
+    """GEOCODE_ONLINE_FALLBACK aus .env: pgeocode (Download) trotz Offline-Index (Default: aus)"""
+    return os.getenv('GEOCODE_ONLINE_FALLBACK', 'False').strip().lower() in {'true', '1', 'yes', 'ja'}
+
+
+def get_cache_path() -> Path:
+    """GEOCODE_CACHE_PATH aus .env oder Default unter .cache/"""
+    v = os.getenv('GEOCODE_CACHE_PATH', '').strip()
+    return Path(v).expanduser().resolve() if v else DEFAULT_CACHE_PATH
+
+
+def dataset_version(cc: str) -> Optional[str]:
+    """
+    Version der pgeocode-Daten eines Landes
+
+    Setzt sich aus pgeocode-Version und Größe/mtime der heruntergeladenen
+    Länderdatei zusammen. None, wenn die Datei (noch) nicht existiert.
+    """
+    path = os.path.join(pgeocode.STORAGE_DIR, cc.upper() + ".txt")
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"pgeocode-{pgeocode.__version__}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def get_nominatim(cc: str) -> pgeocode.Nominatim:
+    """
+    Liefert die prozessweite pgeocode-Instanz eines Landes
+
+    Die Postleitzahl-Tabelle wird pro Prozess nur einmal geparst und über
+    Sheets und wiederholte Builds hinweg wiederverwendet. Wurde die
+    Länderdatei zwischenzeitlich neu heruntergeladen, wird neu geladen.
+    """
+    cc = cc.upper()
+    with _NOMINATIM_LOCK:
+        entry = _NOMINATIM_REGISTRY.get(cc)
+        if entry is not None and entry[0] == dataset_version(cc):
+            return entry[1]
+        geo = pgeocode.Nominatim(cc)
+        _NOMINATIM_REGISTRY[cc] = (dataset_version(cc), geo)
+        return geo
+
+
+def warm_up(countries) -> list:
+    """
+    Lädt die pgeocode-Tabellen der angegebenen Länder vorab in die Registry
+
+    Mit Offline-Index entfällt das für abgedeckte Länder; alle anderen nur
+    mit GEOCODE_ONLINE_FALLBACK (sonst kein Download beim Start).
+
+    Args:
+        countries: ISO2-Ländercodes (unbekannte werden übersprungen)
+
+    Returns:
+        Liste der erfolgreich geladenen Ländercodes
+    """
+    index = get_postal_index()
+    loaded = []
+    for cc in sorted({str(c).upper() for c in countries}):
+        if cc not in pgeocode.COUNTRIES_VALID:
+            continue
+        if index is not None and (cc in index or not online_fallback_enabled()):
+            continue
+        try:
+            get_nominatim(cc)
+            loaded.append(cc)
+        except Exception as e:
+            print(f"   ⚠ Geocoding {cc}: {e}")
+    return loaded
+
+
+def normalize_postal_code(cc: str, code: str) -> str:
+    """PLZ wie pgeocode normalisieren (Großbuchstaben, GB/IE/CA nur erster Teil)"""
+    code = str(code).strip().upper()
+    if cc in ("GB", "IE", "CA"):
+        parts = code.split()
+        code = parts[0] if parts else code
+    return code
+
+
+class PostalIndex:
+    """
+    Offline-PLZ-Index (memory-mapped)
+
+    Layout unter assets/postal_index/:
+      keys.npy  - sortierte Schlüssel "<CC><PLZ>" (Bytes, feste Breite)
+      lat.npy   - float64, gleiche Reihenfolge wie keys
+      lon.npy   - float64, gleiche Reihenfolge wie keys
+      meta.json - Version, Länder, Anzahl Einträge
+
+    Die Arrays werden per np.load(mmap_mode="r") eingebunden und per
+    Binärsuche (np.searchsorted) abgefragt - ohne die Datei einzulesen.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.keys = np.load(self.directory / "keys.npy", mmap_mode="r")
+        self.lat = np.load(self.directory / "lat.npy", mmap_mode="r")
+        self.lon = np.load(self.directory / "lon.npy", mmap_mode="r")
+        self.countries = set(self.meta.get("countries", []))
+        self.version = str(self.meta.get("version", ""))
+
+    def __contains__(self, cc: str) -> bool:
+        return cc in self.countries
+
+    def lookup(self, cc: str, codes: list):
+        """
+        Sucht PLZ eines Landes im Index
+
+        Returns:
+            (lat, lon) als float64-Arrays in der Reihenfolge von codes, NaN wenn unbekannt
+        """
+        lat = np.full(len(codes), np.nan, dtype="float64")
+        lon = np.full(len(codes), np.nan, dtype="float64")
+        if len(self.keys) == 0 or not codes:
+            return lat, lon
+
+        width = self.keys.dtype.itemsize
+        raw = [(cc + normalize_postal_code(cc, c)).encode("utf-8") for c in codes]
+        # Zu lange Schlüssel würden beim Cast abgeschnitten -> nie ein Treffer
+        too_long = np.fromiter((len(k) > width for k in raw), dtype=bool, count=len(raw))
+        query = np.array(raw, dtype=self.keys.dtype)
+
+        pos = np.searchsorted(self.keys, query)
+        pos = np.minimum(pos, len(self.keys) - 1)
+        hit = (self.keys[pos] == query) & ~too_long
+
+        lat[hit] = self.lat[pos[hit]]
+        lon[hit] = self.lon[pos[hit]]
+        return lat, lon
+
+
+_POSTAL_INDEX = {}
+
+
+def get_postal_index_dir() -> Path:
+    """POSTAL_INDEX_PATH aus .env oder Default unter assets/"""
+    v = os.getenv('POSTAL_INDEX_PATH', '').strip()
+    return Path(v).expanduser().resolve() if v else DEFAULT_POSTAL_INDEX_DIR
+
+
+def get_postal_index() -> Optional[PostalIndex]:
+    """Offline-Index (einmal pro Prozess geladen); None wenn nicht vorhanden/deaktiviert"""
+    if os.getenv('POSTAL_INDEX', 'True').strip().lower() in {'false', '0', 'no', 'nein', 'off'}:
+        return None
+    directory = get_postal_index_dir()
+    if directory not in _POSTAL_INDEX:
+        index = None
+        if (directory / "meta.json").exists():
+            try:
+                index = PostalIndex(directory)
+            except (OSError, ValueError) as e:
+                print(f"⚠ PLZ-Index nicht lesbar ({directory}): {e}")
+        _POSTAL_INDEX[directory] = index
+    return _POSTAL_INDEX[directory]
+
+
+class GeocodeCache:
+    """
+    Persistenter Cache (Land, PLZ) -> (lat, lon)
+
+    Auch nicht auflösbare PLZ werden gespeichert (lat/lon = NULL), damit sie
+    nicht bei jedem Lauf erneut abgefragt werden. Ändert sich die Version der
+    Postleitzahl-Daten eines Landes, werden dessen Einträge verworfen.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS dataset (
+                cc      TEXT PRIMARY KEY,
+                version TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS geocode (
+                cc  TEXT NOT NULL,
+                plz TEXT NOT NULL,
+                lat REAL,
+                lon REAL,
+                PRIMARY KEY (cc, plz)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.commit()
+
+    def sync_version(self, cc: str, version: Optional[str]) -> bool:
+        """
+        Gleicht die gespeicherte Datenversion eines Landes ab
+
+        Returns:
+            True, wenn Einträge wegen geänderter Version verworfen wurden
+        """
+        if version is None:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM dataset WHERE cc = ?", (cc,)
+            ).fetchone()
+            if row is not None and row[0] == version:
+                return False
+            self._conn.execute("DELETE FROM geocode WHERE cc = ?", (cc,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dataset (cc, version) VALUES (?, ?)", (cc, version)
+            )
+            self._conn.commit()
+        return row is not None
+
+    def lookup(self, cc: str) -> dict:
+        """Alle gecachten Einträge eines Landes: {plz: (lat, lon)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT plz, lat, lon FROM geocode WHERE cc = ?", (cc,)
+            ).fetchall()
+        return {plz: (lat, lon) for plz, lat, lon in rows}
+
+    def store(self, cc: str, results: dict) -> None:
+        """Speichert {plz: (lat, lon)}; NaN wird als NULL abgelegt"""
+        if not results:
+            return
+        rows = [
+            (cc, plz, _none_if_nan(lat), _none_if_nan(lon))
+            for plz, (lat, lon) in results.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO geocode (cc, plz, lat, lon) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def clear(self, cc: Optional[str] = None) -> None:
+        """Leert den Cache (komplett oder für ein Land)"""
+        with self._lock:
+            if cc is None:
+                self._conn.execute("DELETE FROM geocode")
+                self._conn.execute("DELETE FROM dataset")
+            else:
+                self._conn.execute("DELETE FROM geocode WHERE cc = ?", (cc,))
+                self._conn.execute("DELETE FROM dataset WHERE cc = ?", (cc,))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Anzahl Einträge pro Land"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT cc, COUNT(*) FROM geocode GROUP BY cc ORDER BY cc"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _none_if_nan(v):
+    if v is None:
+        return None
+    v = float(v)
+    return None if v != v else v
+
+
+def open_geocode_cache() -> Optional[GeocodeCache]:
+    """Öffnet den Cache laut .env; None wenn deaktiviert oder nicht nutzbar"""
+    if not cache_enabled():
+        return None
+    path = get_cache_path()
+    try:
+        return GeocodeCache(path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠ Geocode-Cache nicht nutzbar ({path}): {e}")
+        return None
+
+
+def resolve_postal_codes(cc: str, unique_codes: list, cache: Optional[GeocodeCache] = None) -> pd.DataFrame:
+    """
+    Geocodiert eindeutige PLZ eines Landes, bekannte Codes kommen aus dem Cache
+
+    Args:
+        cc: ISO2-Ländercode (pgeocode)
+        unique_codes: normalisierte, eindeutige PLZ
+        cache: optionaler GeocodeCache
+
+    Returns:
+        DataFrame mit Spalten _PLZ, lat, lon (float64, NaN wenn unbekannt)
+    """
+    known = {}
+    if cache is not None:
+        cache.sync_version(cc, dataset_version(cc))
+        known = cache.lookup(cc)
+
+    missing = [c for c in unique_codes if c not in known]
+    if missing:
+        geo = get_nominatim(cc)
+        # Datei existiert erst nach dem ersten Download -> Version erneut prüfen
+        if cache is not None and cache.sync_version(cc, dataset_version(cc)):
+            known = {}
+            missing = list(unique_codes)
+        loc = geo.query_postal_code(missing)
+        fresh = dict(zip(missing, zip(loc["latitude"].values, loc["longitude"].values)))
+        if cache is not None:
+            cache.store(cc, fresh)
+        known.update(fresh)
+
+    coords = [known.get(c, (None, None)) for c in unique_codes]
+    return pd.DataFrame({
+        "_PLZ": unique_codes,
+        "lat": np.array([c[0] for c in coords], dtype="float64"),
+        "lon": np.array([c[1] for c in coords], dtype="float64"),
+    })
+
+
+def geocode_dataframe(df: pd.DataFrame, cache: Optional[GeocodeCache] = None) -> pd.DataFrame:
+    """
+    Geocodiert alle Zeilen anhand der Spalten _CC/_PLZ
+
+    Jede (Land, PLZ)-Kombination wird nur einmal aufgelöst und per Merge
+    auf die Zeilen zurückgeschrieben.
+
+    Länder im Offline-Index werden dort nachgeschlagen, alle anderen über
+    Cache -> pgeocode - bei vorhandenem Index nur mit GEOCODE_ONLINE_FALLBACK.
+
+    Returns:
+        df mit float64-Spalten lat/lon (NaN wenn nicht auflösbar)
+    """
+    index = get_postal_index()
+    keys = pd.DataFrame({
+        "_CC": df["_CC"].astype(str).to_numpy(),
+        "_PLZ": df["_PLZ"].astype(str).to_numpy(),
+    })
+    unique_keys = keys.drop_duplicates()
+
+    parts = []
+    for cc, grp in unique_keys.groupby("_CC", sort=False):
+        try:
+            codes = grp["_PLZ"].tolist()
+            if index is not None and cc in index:
+                lat, lon = index.lookup(cc, codes)
+                resolved = pd.DataFrame({"_PLZ": codes, "lat": lat, "lon": lon})
+            elif index is not None and not online_fallback_enabled():
+                # Offline-Betrieb: kein pgeocode-Download, Projekte bleiben ohne Koordinaten
+                if cc not in _UNCOVERED_WARNED:
+                    _UNCOVERED_WARNED.add(cc)
+                    print(f"⚠ Land {cc} fehlt im PLZ-Index - {len(codes)} PLZ nicht aufgelöst "
+                          f"(build_postal_index.py --countries ... oder GEOCODE_ONLINE_FALLBACK=True)")
+                continue
+            else:
+                resolved = resolve_postal_codes(cc, codes, cache)
+        except Exception:
+            # Fallback: nichts setzen (wird später dropna)
+            continue
+        resolved.insert(0, "_CC", cc)
+        parts.append(resolved)
+
+    if parts:
+        table = pd.concat(parts, ignore_index=True)
+    else:
+        table = pd.DataFrame({
+            "_CC": pd.Series(dtype=str),
+            "_PLZ": pd.Series(dtype=str),
+            "lat": pd.Series(dtype="float64"),
+            "lon": pd.Series(dtype="float64"),
+        })
+
+    merged = keys.merge(table, on=["_CC", "_PLZ"], how="left", sort=False)
+    df = df.copy()
+    df["lat"] = merged["lat"].to_numpy(dtype="float64")
+    df["lon"] = merged["lon"].to_numpy(dtype="float64")
+    return df
+
+
+# Für Debugging / Wartung
+if __name__ == '__main__':
+    import sys
+
+    cache = GeocodeCache(get_cache_path())
+    if '--clear' in sys.argv:
+        cache.clear()
+        print(f"🗑 Geocode-Cache geleert: {cache.path}")
+    else:
+        print(f"📦 Geocode-Cache: {cache.path}")
+        for cc, n in cache.stats().items():
+            print(f"   {cc}: {n} PLZ")
+    cache.close()
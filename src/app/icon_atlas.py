@@ -0,0 +1,159 @@
+"""
+Icon-Atlas - alle Kraftwerks-Icons als ein Sprite (1x und 2x für HiDPI)
+Der Atlas wird unter .cache/icon_atlas/<hash>/ abgelegt. Der Hash ergibt sich
+aus Icon-Größe und Inhalt der Quelldateien - solange sich nichts ändert,
+entfällt bei weiteren Builds jede Bildbearbeitung.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_ATLAS_DIR = PROJECT_ROOT / ".cache" / "icon_atlas"
+
+# Bei Änderungen am Layout erhöhen (alte Atlanten werden dann ignoriert)
+ATLAS_FORMAT = 1
+
+# Quellformate in Reihenfolge der Bevorzugung (z.B. Wasser.png fehlt -> Wasser.ico)
+SOURCE_SUFFIXES = (".png", ".ico")
+
+SCALES = (1, 2)
+
+
+def get_atlas_dir() -> Path:
+    """ICON_ATLAS_DIR aus .env oder Default unter .cache/"""
+    v = os.getenv('ICON_ATLAS_DIR', '').strip()
+    return Path(v).expanduser().resolve() if v else DEFAULT_ATLAS_DIR
+
+
+def resolve_source(path: Path) -> Optional[Path]:
+    """Vorhandene Quelldatei zu einem Icon-Pfad (gleicher Name, PNG vor ICO)"""
+    path = Path(path)
+    for suffix in (path.suffix,) + SOURCE_SUFFIXES:
+        candidate = path.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _source_key(sources: dict, size: int) -> str:
+    h = hashlib.sha256(f"atlas-{ATLAS_FORMAT}:{size}".encode())
+    for name, path in sources.items():
+        h.update(name.encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def _render(sources: dict, size: int, path: Path) -> None:
+    """Horizontaler Streifen: Icon i liegt bei x = i * size"""
+    atlas = Image.new("RGBA", (size * len(sources), size), (0, 0, 0, 0))
+    for i, src in enumerate(sources.values()):
+        # ICO: Pillow lädt standardmäßig die größte enthaltene Auflösung
+        img = Image.open(src).convert("RGBA")
+        img = img.resize((size, size), Image.LANCZOS)
+        atlas.paste(img, (i * size, 0))
+    atlas.save(path, format="PNG", optimize=True)
+
+
+def build_atlas(icons: dict, size: int, atlas_dir: Optional[Path] = None) -> Optional[dict]:
+    """
+    Baut (oder lädt aus dem Cache) den Sprite-Atlas
+
+    Args:
+        icons: {Name: Pfad} wie PLANT_ICONS (fehlende Dateien werden übersprungen)
+        size: Kantenlänge eines Icons in CSS-Pixeln (ICON_SIZE)
+        atlas_dir: Cache-Ordner (None = ICON_ATLAS_DIR / Default)
+
+    Returns:
+        {"size", "names": [...], "files": {scale: Pfad}} oder None (keine Icons)
+    """
+    sources = {}
+    for name, path in icons.items():
+        src = resolve_source(path)
+        if src is None:
+            print(f"⚠ Icon fehlt: {path}")
+            continue
+        sources[name] = src
+    if not sources:
+        return None
+
+    target = (atlas_dir or get_atlas_dir()) / _source_key(sources, size)
+    manifest_path = target / "atlas.json"
+    files = {scale: target / (f"atlas@{scale}x.png" if scale > 1 else "atlas.png") for scale in SCALES}
+
+    if not (manifest_path.exists() and all(p.exists() for p in files.values())):
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.mkdir(parents=True, exist_ok=True)
+        for scale, path in files.items():
+            _render(sources, size * scale, tmp / path.name)
+        manifest = {
+            "format": ATLAS_FORMAT,
+            "size": size,
+            "names": list(sources),
+            "sources": {name: str(src) for name, src in sources.items()},
+        }
+        with open(tmp / "atlas.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        if target.exists():
+            for p in target.iterdir():
+                p.unlink()
+            target.rmdir()
+        os.replace(tmp, target)
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return {"size": manifest["size"], "names": manifest["names"], "files": files}
+
+
+def data_uri(path: Path) -> str:
+    with open(path, "rb") as f:
+        return "data:image/png;base64," + base64.b64encode(f.read()).decode()
+
+
+def atlas_css(atlas: dict, urls: dict, selector: str = ".plant-icon") -> str:
+    """
+    CSS für den Atlas: ein Hintergrundbild, eine background-position pro Icon
+
+    Args:
+        atlas: Ergebnis von build_atlas
+        urls: {scale: URL oder Data-URI} der Atlas-Bilder
+        selector: Klasse der Icon-Elemente (Icons: <selector>.icon-<Name>)
+    """
+    size = atlas["size"]
+    width = size * len(atlas["names"])
+    lines = [
+        f'{selector} {{ background-image:url("{urls[1]}"); '
+        f'background-size:{width}px {size}px; background-repeat:no-repeat; }}',
+    ]
+    if 2 in urls:
+        lines.append(
+            f'@media (-webkit-min-device-pixel-ratio: 1.5), (min-resolution: 1.5dppx) {{ '
+            f'{selector} {{ background-image:url("{urls[2]}"); }} }}'
+        )
+    for i, name in enumerate(atlas["names"]):
+        lines.append(f"{selector}.icon-{name} {{ background-position:-{i * size}px 0; }}")
+    return "\n".join(lines)
+
+
+# Für Debugging / Vorab-Build
+if __name__ == '__main__':
+    import sys
+
+    icon_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else PROJECT_ROOT / "assets" / "icons"
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 18
+    # Ein Eintrag pro Name, resolve_source wählt PNG vor ICO
+    icons = {p.stem: icon_dir / (p.stem + ".png") for p in sorted(icon_dir.iterdir()) if p.suffix.lower() in SOURCE_SUFFIXES}
+    atlas = build_atlas(icons, size)
+    if atlas is None:
+        print("❌ Keine Icons gefunden")
+    else:
+        print(f"✅ Atlas: {', '.join(atlas['names'])}")
+        for scale, path in atlas["files"].items():
+            print(f"   {scale}x: {path} ({path.stat().st_size} Bytes)")
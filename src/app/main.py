@@ -1,26 +1,45 @@
 import math
-import base64
+import html
+import hashlib
+import shutil
 import warnings
 import json
 import os
-from io import BytesIO
 from pathlib import Path
+from typing import Optional
 
 import pandas as pd
 import geopandas as gpd
-import pgeocode
 import folium
+from folium.elements import JSCSSMixin
+from folium.plugins import MarkerCluster
 from branca.element import Element
-from PIL import Image
 
 # Importiere neuen Data Loader (mit Fallback für relative/absolute imports)
 try:
-    from .data_loader import load_projects, get_data_source
+    from .data_loader import (
+        load_projects, load_from_excel, stream_from_database, get_data_source, get_db_chunksize,
+        PROJECT_COLUMNS, PROJECT_DTYPES,
+    )
+    from .geocoding import open_geocode_cache, geocode_dataframe, warm_up, COUNTRY_ALIASES
+    from .icon_atlas import build_atlas, atlas_css, data_uri
+    from .clustering import build_hierarchy, export_hierarchy, fit_zoom, BLOCK_CALLBACK
 except ImportError:
-    from data_loader import load_projects, get_data_source
+    from data_loader import (
+        load_projects, load_from_excel, stream_from_database, get_data_source, get_db_chunksize,
+        PROJECT_COLUMNS, PROJECT_DTYPES,
+    )
+    from geocoding import open_geocode_cache, geocode_dataframe, warm_up, COUNTRY_ALIASES
+    from icon_atlas import build_atlas, atlas_css, data_uri
+    from clustering import build_hierarchy, export_hierarchy, fit_zoom, BLOCK_CALLBACK
 
 ICON_SIZE = 18
 PIN_SIZE = 36
+# Level of Detail: unterhalb LOD_ZOOM nur farbige Punkte statt Pins mit Icon (0 = immer Pins)
+LOD_ZOOM = 7
+DOT_SIZE = 12
+CLUSTER_RADIUS = 60  # Pixel, in denen Projekte einer Kategorie zusammengefasst werden
+CLUSTER_MAX_ZOOM = 12  # RENDER_MODE=hierarchy: letzte Cluster-Stufe, darüber Einzelprojekte
 
 warnings.filterwarnings("ignore")
 
@@ -51,6 +70,22 @@ EXCEL_PATH           = env_path("EXCEL_PATH",           BASE_DIR / 'data/Datenmu
 ICON_DIR             = env_path("ICON_DIR",             BASE_DIR / 'assets/icons')
 OUT_HTML             = env_path("OUT_HTML",             BASE_DIR / "deutschland_projekte.html")
 JITTER_STEP_M = 120
+# Spatial Hash: Projekte in derselben Zelle (Meter) gelten als übereinanderliegend
+DISPLACE_CELL_M = JITTER_STEP_M
+
+# Projekt-Darstellung: "markers" = ein folium.Marker pro Projekt,
+# "data" = ein kompaktes JSON-Payload, Pins werden im Browser gebaut,
+# "cluster" = wie "data", aber je Kategorie zu Clustern zusammengefasst,
+# "hierarchy" = Cluster vorberechnet (clustering.py), Details werden nachgeladen,
+# "canvas" = wie "data", aber Kreise auf einem <canvas> statt DOM-Pins (sehr viele Projekte)
+RENDER_MODES = ("markers", "data", "cluster", "hierarchy", "canvas")
+RENDER_MODE = os.getenv("RENDER_MODE", "markers").strip().lower()
+if RENDER_MODE not in RENDER_MODES:
+    print(f"⚠ Unbekannter RENDER_MODE '{RENDER_MODE}' - nutze 'markers'")
+    RENDER_MODE = "markers"
+
+# Projektliste in der Sidebar: mehr Einträge machen das DOM träge (Filter gelten trotzdem für alle)
+PROJECT_LIST_LIMIT = 500
 
 # ======================================================
 # FARBEN / WHITELIST SHEETS
@@ -82,6 +117,22 @@ PLANT_ICONS = {
     "EZAR": ICON_DIR / "EZAR.png",
 }
 
+# ======================================================
+# ZEILENFILTER (deklarativ, siehe data_loader.FILTER_OPS)
+# Datenbank: als WHERE gepusht, Excel: direkt nach dem Laden angewendet
+# ======================================================
+REQUIRED_COLUMNS = ["Art", "VN", "Name", "Status", "PLZ"]
+
+PROJECT_FILTERS = [
+    # Nur wenn Messtechnik eingebaut == "nein"/false/0/no => Projekt ausblenden
+    # Bei "ja" oder leer => anzeigen
+    {"column": "Messtechnik eingebaut", "op": "not_in", "values": ["nein", "no", "false", "0"], "casefold": True},
+    # Art muss exakt einem Key aus PLANT_ICONS entsprechen
+    {"column": "Art", "op": "in", "values": list(PLANT_ICONS)},
+    # Ohne PLZ kein Geocoding
+    {"column": "PLZ", "op": "not_null"},
+] + [{"column": c, "op": "exists"} for c in REQUIRED_COLUMNS]
+
 # ======================================================
 # HAUPTSTÄDTE DE (16)
 # ======================================================
@@ -203,77 +254,158 @@ EU_CAPITALS = {
 # ======================================================
 # HILFSFUNKTIONEN
 # ======================================================
-def image_to_base64(path: Path) -> str:
-    img = Image.open(path).convert("RGBA")
-    img = img.resize((ICON_SIZE, ICON_SIZE), Image.LANCZOS)
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+def plant_icon_atlas():
+    """
+    Sprite-Atlas der Kraftwerks-Icons (icon_atlas.py) und seine URLs
+
+    ICON_ATLAS_INLINE=False legt den Atlas als Datei neben OUT_HTML ab
+    (ein gecachter Bild-Request statt Data-URI im HTML).
+
+    Returns:
+        (atlas, {scale: URL}) oder (None, {}) ohne Icons
+    """
+    atlas = build_atlas(PLANT_ICONS, ICON_SIZE)
+    if atlas is None:
+        return None, {}
+
+    if os.getenv("ICON_ATLAS_INLINE", "True").strip().lower() in {"false", "0", "no", "nein"}:
+        asset_dir = OUT_HTML.parent / f"{OUT_HTML.stem}_icons"
+        asset_dir.mkdir(parents=True, exist_ok=True)
+        urls = {}
+        for scale, path in atlas["files"].items():
+            target = asset_dir / f"{path.parent.name}{path.name[len('atlas'):]}"
+            if not target.exists():
+                shutil.copyfile(path, target)
+            urls[scale] = f"{asset_dir.name}/{target.name}"
+    else:
+        urls = {scale: data_uri(path) for scale, path in atlas["files"].items()}
+    return atlas, urls
+
+def plant_icon_css(atlas, urls) -> str:
+    """
+    CSS für die Kraftwerks-Icons: alle PLANT_ICONS liegen in einem Bild (plus 2x
+    für HiDPI), die Pins wählen ihr Icon über die Klasse icon-<Art> per background-position.
+    """
+    if atlas is None:
+        return ""
+    return "<style>\n" + atlas_css(atlas, urls) + "\n</style>"
+
+def canvas_icon_atlas(atlas, urls) -> Optional[dict]:
+    """Atlas-Angaben für RENDER_MODE=canvas (größte Auflösung, wird auf ICON_SIZE skaliert)"""
+    if atlas is None:
+        return None
+    scale = max(urls)
+    return {
+        "url": urls[scale],
+        "scale": scale,
+        "size": atlas["size"],
+        "index": {name: i for i, name in enumerate(atlas["names"])},
+    }
 
 def meters_to_deg(lat, east, north):
     dlat = north / 111_320
     dlon = east / (111_320 * max(math.cos(math.radians(lat)), 1e-6))
     return dlat, dlon
 
-def spiral(n, step):
+def spiral(n, step, start=0):
     return [
         (step * math.sqrt(i) * math.cos(i * 0.9),
          step * math.sqrt(i) * math.sin(i * 0.9))
-        for i in range(n)
+        for i in range(start, start + n)
     ]
 
-def normalize_status(value) -> str:
-    if isinstance(value, str) and value.strip().lower() == "angebot":
-        return "Angebot"
-    return "Auftrag"
-
-def safe_str(v, fallback="—") -> str:
-    if pd.isna(v):
-        return fallback
-    s = str(v).replace("\xa0", " ").strip()
-    return s if s else fallback
-
-# Nur wenn Messtechnik eingebaut == "nein"/false/0/no => Projekt ausblenden
-# Bei "ja" oder leer => anzeigen
-def hide_if_messtechnik_eingebaut_nein(value) -> bool:
-    if pd.isna(value):
-        return False  # leer => anzeigen
-    v = str(value).replace("\xa0", " ").strip().lower()
-    return v in {"nein", "no", "false", "0"}
-
-def normalize_country_for_pgeocode(v) -> str:
+def project_key(rec: dict) -> str:
+    """Stabiler Schlüssel eines Projekts (unabhängig von Zeilenreihenfolge und Chunks)"""
+    raw = "\x1f".join(str(rec[f]) for f in ("category", "vn", "name", "plz"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def displace_overlaps(records, step=JITTER_STEP_M, cell_m=DISPLACE_CELL_M):
+    """
+    Verschiebt nur übereinanderliegende Projekte auf eine Spirale
+
+    Projekte werden per Spatial Hash (Zellen von cell_m Metern) gruppiert;
+    allein liegende Projekte bleiben exakt auf ihrer Koordinate. Innerhalb
+    einer Gruppe bestimmt die Sortierung nach project_key den Spiral-Platz -
+    gleiche Daten ergeben damit unabhängig von Zeilen-, Sheet- und
+    Chunk-Reihenfolge gleiche Koordinaten. Dafür muss jede Zelle vollständig
+    sein: alle Projekte auf einmal (die Render-Modi halten sie ohnehin alle).
+    """
+    records = list(records)
+    cell_lat = cell_m / 111_320
+    buckets = {}
+    for rec in records:
+        row = math.floor(rec["lat"] / cell_lat)
+        # Zellbreite in Längengrad pro Zeile fest -> gleiche Koordinate = gleiche Zelle
+        cell_lon = cell_m / (111_320 * max(math.cos(math.radians(row * cell_lat)), 1e-6))
+        buckets.setdefault((row, math.floor(rec["lon"] / cell_lon)), []).append(rec)
+
+    for group in buckets.values():
+        if len(group) < 2:
+            continue
+        group.sort(key=project_key)
+        for rec, (east, north) in zip(group, spiral(len(group), step)):
+            dlat, dlon = meters_to_deg(rec["lat"], east, north)
+            rec["lat"] += dlat
+            rec["lon"] += dlon
+    return records
+
+# ======================================================
+# NORMALISIERUNG (vektorisiert, ganze Spalten statt pro Zeile)
+# ======================================================
+def normalize_text(s: pd.Series, fallback="—") -> pd.Series:
+    """Text säubern: NBSP -> Leerzeichen, trimmen, leer/NaN -> fallback"""
+    text = s.astype("str").str.replace("\xa0", " ", regex=False).str.strip()
+    return text.where(s.notna() & text.ne(""), fallback)
+
+def normalize_status(s: pd.Series) -> pd.Series:
+    """Nur "Angebot" bleibt Angebot, alles andere (auch leer) => Auftrag"""
+    angebot = s.notna() & s.astype("str").str.strip().str.lower().eq("angebot")
+    return pd.Series("Auftrag", index=s.index, dtype="str").where(~angebot, "Angebot")
+
+def normalize_country_for_pgeocode(s: pd.Series) -> pd.Series:
     """
     Optional: falls Excel 'Land' hat. Erwartet idealerweise ISO2 ("DE","AT"...).
-    Wenn leer/unbekannt -> DE.
+    Freitext über COUNTRY_ALIASES, wenn leer/unbekannt -> DE.
     """
-    if pd.isna(v):
-        return "DE"
-    s = str(v).strip()
-    if not s:
-        return "DE"
-
-    s_low = s.lower()
-    mapping = {
-        "de": "DE", "deu": "DE", "germany": "DE", "deutschland": "DE",
-        "at": "AT", "aut": "AT", "austria": "AT", "österreich": "AT", "osterreich": "AT",
-        "ch": "CH", "che": "CH", "switzerland": "CH", "schweiz": "CH",
-        "nl": "NL", "nld": "NL", "netherlands": "NL", "holland": "NL",
-        "be": "BE", "belgium": "BE", "belgien": "BE",
-        "fr": "FR", "france": "FR", "frankreich": "FR",
-        "pl": "PL", "poland": "PL", "polen": "PL",
-        "cz": "CZ", "czechia": "CZ", "tschechien": "CZ",
-        "dk": "DK", "denmark": "DK", "dänemark": "DK", "danemark": "DK",
-        "se": "SE", "sweden": "SE", "schweden": "SE",
-        "no": "NO", "norway": "NO", "norwegen": "NO",
-        "es": "ES", "spain": "ES", "spanien": "ES",
-        "pt": "PT", "portugal": "PT",
-        "it": "IT", "italy": "IT", "italien": "IT",
-    }
+    text = s.astype("str").str.strip()
+    valid = s.notna() & text.ne("")
+    iso2 = valid & text.str.len().eq(2) & text.str.isalpha()
+    codes = text.str.lower().map(COUNTRY_ALIASES).where(valid).fillna("DE")
+    return codes.where(~iso2, text.str.upper()).astype("str")
 
-    if len(s) == 2 and s.upper().isalpha():
-        return s.upper()
+def normalize_projects(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bereitet alle Anzeige-Spalten einmal pro Sheet/Chunk auf
 
-    return mapping.get(s_low, "DE")
+    Art wird getrimmt, Status auf Angebot/Auftrag reduziert, Name/VN/Kunde/PLZ
+    bekommen "—" als Fallback, _CC/_PLZ sind die Geocoding-Schlüssel.
+    """
+    df = df.copy()
+    df["Art"] = normalize_text(df["Art"], "")
+    df["Status"] = normalize_status(df["Status"])
+    for col in ("Name", "VN", "Kunde"):
+        df[col] = normalize_text(df[col]) if col in df.columns else "—"
+
+    # PLZ kommt laut PROJECT_DTYPES bereits als Text (kein float-Umweg)
+    plz = df["PLZ"].astype("str").str.strip()
+    df["PLZ"] = normalize_text(df["PLZ"])
+
+    # Optional: Land -> country code
+    if "Land" in df.columns:
+        df["_CC"] = normalize_country_for_pgeocode(df["Land"])
+    else:
+        df["_CC"] = "DE"
+
+    # PLZ in vielen Ländern nicht immer 5-stellig – für DE ist das wichtig
+    # Wir zfill nur bei DE, sonst lassen wir es so.
+    df["_PLZ"] = plz.where(df["_CC"] != "DE", plz.str.zfill(5))
+    return df
+
+def warm_up_geocoder() -> None:
+    """Lädt pgeocode-Tabellen aller EUROPEAN_COUNTRIES vorab (GEOCODE_WARMUP=True)"""
+    codes = set(normalize_country_for_pgeocode(pd.Series(sorted(EUROPEAN_COUNTRIES)))) | {"DE"}
+    loaded = warm_up(codes)
+    print(f"🌐 Geocoding vorgeladen: {', '.join(loaded) if loaded else '—'}")
 
 def load_europe_geojson(path: Path):
     if not path.exists():
@@ -281,10 +413,615 @@ def load_europe_geojson(path: Path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+# ======================================================
+# PROJEKT-PIPELINE (normalisieren -> geocodieren -> Marker)
+# Arbeitet auf (sheet, DataFrame)-Paaren - ganze Sheets oder DB-Chunks
+# ======================================================
+def load_project_source():
+    """
+    (sheet, DataFrame)-Paare aus der konfigurierten Datenquelle
+
+    Datenbank mit DB_CHUNKSIZE wird gestreamt, sonst ganze Sheets; bei
+    Fehlern Fallback auf die Excel-Datei.
+    """
+    print(f"\n📊 Datenquelle: {get_data_source().upper()}")
+
+    try:
+        chunksize = get_db_chunksize()
+        if get_data_source() == "database" and chunksize:
+            # Streaming: (sheet, chunk)-Paare, Speicher begrenzt durch DB_CHUNKSIZE
+            return stream_from_database(
+                columns=PROJECT_COLUMNS, dtypes=PROJECT_DTYPES, chunksize=chunksize,
+                filters=PROJECT_FILTERS,
+            )
+        else:
+            return load_projects(
+                columns=PROJECT_COLUMNS, dtypes=PROJECT_DTYPES, filters=PROJECT_FILTERS
+            ).items()
+    except Exception as e:
+        print(f"❌ Fehler beim Laden der Projekte: {e}")
+        print(f"   Fallback auf Excel: {EXCEL_PATH}")
+        try:
+            return load_from_excel(
+                str(EXCEL_PATH), columns=PROJECT_COLUMNS, dtypes=PROJECT_DTYPES, filters=PROJECT_FILTERS
+            ).items()
+        except Exception as e2:
+            print(f"❌ Auch Excel-Fallback fehlgeschlagen: {e2}")
+            return []
+
+def iter_project_frames(frames, geocode_cache=None):
+    """Normalisiert (normalize_projects) und geocodiert jedes (sheet, df)-Paar"""
+    warned = set()
+    for sheet, df in frames:
+        if sheet not in CATEGORY_COLOR:
+            continue
+
+        required = set(REQUIRED_COLUMNS)
+        if not df.empty and not required.issubset(df.columns):
+            if sheet not in warned:
+                print(f"⚠ Sheet '{sheet}' hat nicht alle erforderlichen Spalten: {required}")
+                warned.add(sheet)
+            continue
+
+        if df.empty:
+            continue
+
+        df = normalize_projects(df)
+
+        # Geocoding: jede (Land, PLZ)-Kombination nur einmal (Cache -> pgeocode)
+        df = geocode_dataframe(df, geocode_cache)
+        df = df.dropna(subset=["lat", "lon"]).reset_index(drop=True)
+
+        yield sheet, df
+
+def iter_project_records(frames):
+    """
+    Erzeugt ein Dict pro Projekt aus geocodierten (sheet, df)-Paaren
+
+    Enthält alle Anzeige-Werte und die Koordinaten - übereinanderliegende
+    Projekte per displace_overlaps verschoben. Grundlage für alle Render-Modi.
+    Die DataFrames werden weiterhin Sheet für Sheet bzw. Chunk für Chunk
+    verarbeitet und danach freigegeben; gesammelt werden nur die Dicts.
+    """
+    return displace_overlaps(_project_rows(frames))
+
+def _project_rows(frames):
+    pid_counter = 0
+    for sheet, df in frames:
+        # Messtechnik/Art/PLZ sind bereits per PROJECT_FILTERS gefiltert,
+        # alle Texte bereits normalisiert (normalize_projects)
+        rows = zip(
+            df["Art"], df["Status"], df["Name"], df["VN"], df["Kunde"],
+            df["PLZ"], df["_CC"], df["lat"], df["lon"],
+        )
+        for plant, status, name, vn, kunde, plz, country, lat, lon in rows:
+            if plant not in PLANT_ICONS:
+                continue
+
+            pid = f"proj-{pid_counter}"
+            pid_counter += 1
+
+            yield {
+                "id": pid,
+                "category": sheet,
+                "plant": plant,
+                "status": status,
+                "name": name,
+                "vn": vn,
+                "kunde": kunde,
+                "plz": plz,
+                "country": country,
+                "lat": float(lat),
+                "lon": float(lon),
+            }
+
+def project_marker(rec: dict) -> folium.Marker:
+    """
+    folium.Marker (DivIcon) für ein Projekt-Dict aus iter_project_records
+
+    Kein vorgerendertes Popup: die data-*-Attribute sind der Datensatz, das
+    Popup baut der Browser erst beim Anklicken (project_popup_js).
+    """
+    status = rec["status"]
+    status_color = STATUS_RING_COLOR[status]
+    attr = {k: html.escape(str(v), quote=True) for k, v in rec.items()}
+
+    icon_html = f"""
+            <div class="pin project-marker"
+                 data-id="{attr["id"]}"
+                 data-category="{attr["category"]}"
+                 data-plant="{attr["plant"]}"
+                 data-name="{attr["name"]}"
+                 data-vn="{attr["vn"]}"
+                 data-kunde="{attr["kunde"]}"
+                 data-status="{attr["status"]}"
+                 data-plz="{attr["plz"]}"
+                 data-country="{attr["country"]}"
+                 data-lat="{rec["lat"]}"
+                 data-lon="{rec["lon"]}"
+                 style="--status:{status_color};--cat:{CATEGORY_COLOR.get(rec["category"], "#868e96")}">
+                <span class="plant-icon icon-{attr["plant"]}"></span>
+            </div>
+            """
+
+    return folium.Marker(
+        [rec["lat"], rec["lon"]],
+        icon=folium.DivIcon(
+            html=icon_html,
+            icon_size=(PIN_SIZE, PIN_SIZE),
+            icon_anchor=(PIN_SIZE // 2, PIN_SIZE // 2),
+        ),
+    )
+
+# ======================================================
+# POPUPS (im Browser aus dem Projekt-Datensatz, erst beim Öffnen)
+# ======================================================
+def project_popup_js(map_name: str) -> str:
+    """
+    Gemeinsamer Client-Code für alle Render-Modi (Popup, Pin- und Cluster-Symbol)
+
+    buildPopupHtml(p) erzeugt das Popup aus einem Datensatz (Daten-Layer-Record
+    oder data-*-Attribute eines Pins). Marker ohne Popup bekommen nach dem
+    Laden eine Popup-Funktion - gerendert wird erst beim Anklicken.
+    """
+    js = """
+    <script>
+    var PROJECT_PIN = __PIN_SIZE__;
+    var PROJECT_STATUS_RING = __STATUS_RING__;
+    var PROJECT_CATEGORY_COLOR = __CATEGORY_COLOR__;
+
+    window.escapeHtml = function(s) {
+      return String(s == null ? '' : s)
+        .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+    };
+
+    window.buildPopupHtml = function(p) {
+      var esc = window.escapeHtml;
+      function row(k, v) {
+        return '<div class="row"><div class="k">' + k + '</div><div class="v">' + v + '</div></div>';
+      }
+      var badge = "<span class='badge " + (p.status === 'Angebot' ? 'angebot' : 'auftrag') + "'>" + esc(p.status) + "</span>";
+      return '<div class="popup"><h3>' + esc(p.name) + '</h3>'
+        + row('Kunde', esc(p.kunde)) + row('VN', esc(p.vn)) + row('Status', badge)
+        + row('Kategorie', esc(p.category)) + row('Kraftwerksart', esc(p.plant))
+        + row('PLZ', esc(p.plz)) + '</div>';
+    };
+
+    // Gleiches Markup wie die Python-Marker (CSS, Hervorhebung, Popup-Binding)
+    window.projectPinIcon = function(p) {
+      var esc = window.escapeHtml;
+      var html = '<div class="pin project-marker"'
+        + ' data-id="' + esc(p.id) + '" data-category="' + esc(p.category) + '"'
+        + ' data-plant="' + esc(p.plant) + '" data-name="' + esc(p.name) + '"'
+        + ' data-vn="' + esc(p.vn) + '" data-kunde="' + esc(p.kunde) + '"'
+        + ' data-status="' + esc(p.status) + '" data-plz="' + esc(p.plz) + '"'
+        + ' data-country="' + esc(p.country) + '"'
+        + ' data-lat="' + p.lat + '" data-lon="' + p.lon + '"'
+        + ' style="--status:' + PROJECT_STATUS_RING[p.status]
+        + ';--cat:' + (PROJECT_CATEGORY_COLOR[p.category] || '#868e96') + '">'
+        + '<span class="plant-icon icon-' + esc(p.plant) + '"></span></div>';
+      var pin = PROJECT_PIN;
+      return L.divIcon({ html: html, className: 'empty', iconSize: [pin, pin], iconAnchor: [pin / 2, pin / 2] });
+    };
+
+    // Cluster-Symbol: Füllung = Kategorie, Ring = Anteil Angebot/Auftrag
+    window.projectClusterIcon = function(category, n, angebot) {
+      var deg = Math.round(angebot / n * 360);
+      var pin = PROJECT_PIN;
+      var size = n < 10 ? pin : (n < 100 ? pin + 6 : (n < 1000 ? pin + 12 : pin + 18));
+      var html = '<div class="project-cluster" style="width:' + size + 'px;height:' + size + 'px;'
+        + '--cat:' + (PROJECT_CATEGORY_COLOR[category] || '#868e96') + ';'
+        + 'background:conic-gradient(' + PROJECT_STATUS_RING['Angebot'] + ' 0deg ' + deg + 'deg,'
+        + PROJECT_STATUS_RING['Auftrag'] + ' ' + deg + 'deg 360deg)">'
+        + '<span>' + n + '</span></div>';
+      return L.divIcon({ html: html, className: 'empty', iconSize: [size, size], iconAnchor: [size / 2, size / 2] });
+    };
+
+    window.bindProjectPopups = function(map) {
+      map.eachLayer(function(layer) {
+        if (!(layer instanceof L.Marker) || !layer._icon || layer.getPopup()) return;
+        var el = layer._icon.querySelector('.project-marker');
+        if (!el) return;
+        layer.bindPopup(function() { return window.buildPopupHtml(el.dataset); }, { maxWidth: 580 });
+      });
+    };
+
+    // Level of Detail: ein zoomend-Handler schaltet nur die Klasse lod-dots am
+    // Karten-Container (CSS), Layer ohne DOM-Pins hängen sich über window.PROJECT_LOD an
+    window.PROJECT_LOD_DOTS = false;
+    window.initProjectLod = function(map) {
+      function update() {
+        var dots = map.getZoom() < __LOD_ZOOM__;
+        if (dots === window.PROJECT_LOD_DOTS) return;
+        window.PROJECT_LOD_DOTS = dots;
+        map.getContainer().classList.toggle('lod-dots', dots);
+        if (window.PROJECT_LOD) window.PROJECT_LOD(dots);
+      }
+      map.on('zoomend', update);
+      update();
+    };
+
+    document.addEventListener('DOMContentLoaded', function() {
+      window.bindProjectPopups(__MAP__);
+      window.initProjectLod(__MAP__);
+    });
+    </script>
+    """
+    return (
+        js.replace("__MAP__", map_name)
+        .replace("__PIN_SIZE__", str(PIN_SIZE))
+        .replace("__STATUS_RING__", json.dumps(STATUS_RING_COLOR))
+        .replace("__CATEGORY_COLOR__", json.dumps(CATEGORY_COLOR))
+        .replace("__LOD_ZOOM__", str(LOD_ZOOM))
+    )
+
+# ======================================================
+# DATEN-LAYER (RENDER_MODE=data)
+# Alle Projekte als ein spaltenweises JSON, Pins baut der Browser
+# ======================================================
+PROJECT_DICT_FIELDS = ["category", "plant", "status", "country"]   # als Index in Werteliste
+PROJECT_TEXT_FIELDS = ["name", "vn", "kunde", "plz"]
+
+def project_data_payload(records) -> dict:
+    """
+    Spaltenweises Payload aller Projekte
+
+    Wenige verschiedene Werte (Kategorie, Art, Status, Land) werden als Index
+    in eine Werteliste kodiert, Koordinaten auf 6 Nachkommastellen (~10 cm)
+    gerundet - wenige Dutzend Bytes pro Projekt.
+    """
+    values = {f: [] for f in PROJECT_DICT_FIELDS}
+    lookup = {f: {} for f in PROJECT_DICT_FIELDS}
+    cols = {f: [] for f in PROJECT_DICT_FIELDS + PROJECT_TEXT_FIELDS + ["lat", "lon"]}
+
+    for rec in records:
+        for f in PROJECT_DICT_FIELDS:
+            v = rec[f]
+            if v not in lookup[f]:
+                lookup[f][v] = len(values[f])
+                values[f].append(v)
+            cols[f].append(lookup[f][v])
+        for f in PROJECT_TEXT_FIELDS:
+            cols[f].append(rec[f])
+        cols["lat"].append(round(rec["lat"], 6))
+        cols["lon"].append(round(rec["lon"], 6))
+
+    return {"values": values, "count": len(cols["lat"]), **cols}
+
+class MarkerClusterAssets(JSCSSMixin):
+    """Nur die Leaflet.markercluster-Skripte (Cluster baut project_layer_js im Browser)"""
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+def project_layer_js(payload: dict, map_name: str, mode: str = "data", icons: Optional[dict] = None) -> str:
+    """
+    JavaScript für den Daten-Layer: ein pointToLayer baut alle Pins aus dem Payload
+
+    Jedes Projekt landet als {p, layer, visible} in window.PROJECT_ENTRIES
+    (Registry für Sidebar/Filter). Je nach mode:
+      data    - ein DivIcon-Pin pro Projekt
+      cluster - Pins in einer Cluster-Gruppe pro Kategorie
+      canvas  - Kreise mit Status-Ring und Icon auf einem gemeinsamen <canvas>
+    Ohne DOM-Pin (cluster/canvas) laufen Sichtbarkeit, Fokus und Hervorhebung
+    über window.PROJECT_SET_VISIBLE / PROJECT_FOCUS / PROJECT_HIGHLIGHT.
+
+    Args:
+        icons: Atlas für canvas (canvas_icon_atlas), None = Kreise ohne Icon
+    """
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    js = """
+    // Läuft nach dem Folium-Skript (Karte existiert erst dann)
+    document.addEventListener('DOMContentLoaded', function() {
+      var map = __MAP__;
+      var D = __DATA__;
+      var MODE = __MODE__;
+      var DOT = __DOT_SIZE__;
+      var ICONS = __ICONS__;
+
+      function projectRecord(i) {
+        return {
+          id: 'proj-' + i,
+          category: D.values.category[D.category[i]],
+          plant: D.values.plant[D.plant[i]],
+          status: D.values.status[D.status[i]],
+          country: D.values.country[D.country[i]],
+          name: D.name[i], vn: D.vn[i], kunde: D.kunde[i], plz: D.plz[i],
+          lat: D.lat[i], lon: D.lon[i]
+        };
+      }
+
+      // Canvas: Kreis mit Status-Ring, Icon direkt aus dem Atlas-Bild gezeichnet.
+      // Klicks trifft der Canvas-Renderer über die Kreisgeometrie (kein DOM pro Projekt).
+      var renderer = MODE === 'canvas' ? L.canvas({ padding: 0.5 }) : null;
+      var iconImage = null;
+      var ProjectDot = L.CircleMarker.extend({
+        _updatePath: function() {
+          L.CircleMarker.prototype._updatePath.call(this);
+          if (window.PROJECT_LOD_DOTS) return;
+          var i = ICONS ? ICONS.index[this.project.plant] : undefined;
+          if (i === undefined || !iconImage || !iconImage.complete || this._empty()) return;
+          var s = ICONS.size, k = ICONS.scale, pt = this._point;
+          this._renderer._ctx.drawImage(iconImage, i * s * k, 0, s * k, s * k, pt.x - s / 2, pt.y - s / 2, s, s);
+        }
+      });
+
+      function ringStyle(p, active) {
+        return active
+          ? { color: '#339af0', weight: 5 }
+          : { color: PROJECT_STATUS_RING[p.status], weight: 3 };
+      }
+
+      function projectPointToLayer(p, latlng) {
+        var marker = renderer
+          ? new ProjectDot(latlng, Object.assign({
+              renderer: renderer, radius: PROJECT_PIN / 2 - 1.5, fillColor: '#ffffff', fillOpacity: 1
+            }, ringStyle(p, false)))
+          : L.marker(latlng, { icon: window.projectPinIcon(p) });
+        marker.bindPopup(function() { return window.buildPopupHtml(p); }, { maxWidth: 580 });
+        marker.project = p;
+        return marker;
+      }
+
+      function clusterIcon(category) {
+        return function(cluster) {
+          var children = cluster.getAllChildMarkers();
+          var angebot = 0;
+          for (var k = 0; k < children.length; k++) {
+            if (children[k].project.status === 'Angebot') angebot++;
+          }
+          return window.projectClusterIcon(category, children.length, angebot);
+        };
+      }
+
+      var entries = [];
+      var byCategory = {};
+      for (var i = 0; i < D.count; i++) {
+        var p = projectRecord(i);
+        var marker = projectPointToLayer(p, L.latLng(p.lat, p.lon));
+        entries.push({ p: p, layer: marker, visible: true });
+        (byCategory[p.category] = byCategory[p.category] || []).push(marker);
+      }
+
+      var layer = L.layerGroup();
+      if (MODE === 'cluster') {
+        var groups = {};
+        Object.keys(byCategory).forEach(function(cat) {
+          groups[cat] = L.markerClusterGroup({
+            chunkedLoading: true,
+            showCoverageOnHover: false,
+            maxClusterRadius: __CLUSTER_RADIUS__,
+            iconCreateFunction: clusterIcon(cat)
+          });
+          groups[cat].addLayers(byCategory[cat]);
+          layer.addLayer(groups[cat]);
+        });
+
+        // changes: [[entry, sichtbar], ...] - gesammelt pro Gruppe, ein Re-Clustering je Aufruf
+        window.PROJECT_SET_VISIBLE = function(changes) {
+          var add = {}, remove = {};
+          changes.forEach(function(c) {
+            var bucket = c[1] ? add : remove;
+            (bucket[c[0].p.category] = bucket[c[0].p.category] || []).push(c[0].layer);
+          });
+          Object.keys(remove).forEach(function(cat) { groups[cat].removeLayers(remove[cat]); });
+          Object.keys(add).forEach(function(cat) { groups[cat].addLayers(add[cat]); });
+        };
+        window.PROJECT_FOCUS = function(entry, done) {
+          groups[entry.p.category].zoomToShowLayer(entry.layer, done);
+        };
+      } else {
+        entries.forEach(function(e) { layer.addLayer(e.layer); });
+      }
+      layer.addTo(map);
+
+      if (renderer) {
+        window.PROJECT_SET_VISIBLE = function(changes) {
+          changes.forEach(function(c) {
+            if (c[1]) layer.addLayer(c[0].layer);
+            else layer.removeLayer(c[0].layer);
+          });
+        };
+        window.PROJECT_HIGHLIGHT = function(entry, active) {
+          entry.layer.setStyle(ringStyle(entry.p, active));
+          if (active) entry.layer.bringToFront();
+        };
+        // Level of Detail: nur beim Überschreiten von LOD_ZOOM, Kreise werden nicht neu gebaut
+        window.PROJECT_LOD = function(dots) {
+          entries.forEach(function(e) {
+            e.layer.setRadius(dots ? DOT / 2 : PROJECT_PIN / 2 - 1.5);
+            e.layer.setStyle({ fillColor: dots ? (PROJECT_CATEGORY_COLOR[e.p.category] || '#868e96') : '#ffffff' });
+          });
+        };
+        if (window.PROJECT_LOD_DOTS) window.PROJECT_LOD(true);
+        if (ICONS) {
+          // Atlas einmal laden, danach alle Kreise in einem Frame neu zeichnen
+          iconImage = new Image();
+          iconImage.onload = function() { layer.eachLayer(function(l) { l.redraw(); }); };
+          iconImage.src = ICONS.url;
+        }
+      }
+
+      window.PROJECT_LAYER = layer;
+      window.PROJECT_ENTRIES = entries;
+      window.projectRecord = projectRecord;
+    });
+    """
+    return (
+        js.replace("__MAP__", map_name)
+        .replace("__DATA__", data)
+        .replace("__MODE__", json.dumps(mode))
+        .replace("__DOT_SIZE__", str(DOT_SIZE))
+        .replace("__ICONS__", json.dumps(icons))
+        .replace("__CLUSTER_RADIUS__", str(CLUSTER_RADIUS))
+    )
+
+# ======================================================
+# CLUSTER-HIERARCHIE (RENDER_MODE=hierarchy)
+# Vorberechnete Cluster pro Zoomstufe (clustering.py), feinere Stufen per Nachladen
+# ======================================================
+def project_hierarchy_js(export: dict, map_name: str, block_url: str) -> str:
+    """
+    JavaScript für die Cluster-Hierarchie aus clustering.export_hierarchy
+
+    Bis embedZoom (mindestens Start-Zoom) sind die Stufen eingebettet, darüber
+    werden die Blöcke im Sichtbereich als <block_url>/<z>/<bx>_<by>.js
+    nachgeladen. Oberhalb von maxZoom kommen Einzelprojekte - nur die landen
+    in window.PROJECT_ENTRIES.
+    Filter wirken über die Anzahlen je (Art, Status, Land) direkt auf die Cluster.
+    """
+    data = json.dumps(
+        {k: v for k, v in export.items() if k != "blocks"}, ensure_ascii=False, separators=(",", ":")
+    ).replace("</", "<\\/")
+    js = """
+    // Läuft nach dem Folium-Skript (Karte existiert erst dann)
+    document.addEventListener('DOMContentLoaded', function() {
+      var map = __MAP__;
+      var H = __DATA__;
+      var BASE = __BLOCK_URL__;
+      var V = H.values;
+
+      var blocks = {};    // "z/bx/by" -> Zeilen, null = lädt noch
+      var entries = [];   // Registry: nur bereits geladene Einzelprojekte
+      var layer = L.layerGroup().addTo(map);
+
+      function passes(p) {
+        return window.projectPasses ? window.projectPasses(p) : true;
+      }
+
+      function levelFor(zoom) {
+        return Math.max(H.minZoom, Math.min(Math.round(zoom), H.maxZoom + 1));
+      }
+
+      // Blöcke im Sichtbereich (mit Rand) auf Stufe z
+      function visibleBlocks(z) {
+        var bounds = map.getBounds().pad(0.25);
+        var nw = map.project(bounds.getNorthWest(), z);
+        var se = map.project(bounds.getSouthEast(), z);
+        var keys = [];
+        for (var bx = Math.floor(nw.x / H.blockPx); bx <= Math.floor(se.x / H.blockPx); bx++) {
+          for (var by = Math.floor(nw.y / H.blockPx); by <= Math.floor(se.y / H.blockPx); by++) {
+            keys.push(z + '/' + bx + '/' + by);
+          }
+        }
+        return keys;
+      }
+
+      function loadBlock(key) {
+        if (key in blocks) return;
+        blocks[key] = null;
+        var parts = key.split('/');
+        var script = document.createElement('script');
+        script.src = BASE + '/' + parts[0] + '/' + parts[1] + '_' + parts[2] + '.js';
+        // Keine Datei = keine Projekte in diesem Block
+        script.onerror = function() { blocks[key] = []; render(); };
+        document.head.appendChild(script);
+      }
+
+      function pointEntry(r) {
+        var p = {
+          category: V.category[r[0]], plant: V.plant[r[1]], status: V.status[r[2]], country: V.country[r[3]],
+          id: r[4], name: r[5], vn: r[6], kunde: r[7], plz: r[8], lat: r[9], lon: r[10]
+        };
+        var marker = L.marker([p.lat, p.lon], { icon: window.projectPinIcon(p) });
+        marker.bindPopup(function() { return window.buildPopupHtml(p); }, { maxWidth: 580 });
+        var e = { p: p, layer: marker, visible: passes(p) };
+        entries.push(e);
+        return e;
+      }
+
+      // Einzelprojekte eingebettet (wenige Projekte) -> sofort in die Registry
+      if (H.embedZoom > H.maxZoom) {
+        H.levels[H.maxZoom + 1] = H.levels[H.maxZoom + 1].map(pointEntry);
+      }
+
+      window.__BLOCK_CALLBACK__ = function(z, bx, by, rows) {
+        blocks[z + '/' + bx + '/' + by] = z > H.maxZoom ? rows.map(pointEntry) : rows;
+        if (z > H.maxZoom && typeof refreshProjectsSoon === 'function') refreshProjectsSoon();
+        render();
+      };
+
+      // Gefilterte Anzahl (und davon Angebote) eines Clusters aus seinen Gruppen
+      function clusterCounts(r) {
+        var category = V.category[r[2]];
+        var g = r[4], n = 0, angebot = 0;
+        for (var k = 0; k < g.length; k += 4) {
+          if (!passes({ category: category, plant: V.plant[g[k]], country: V.country[g[k + 2]] })) continue;
+          n += g[k + 3];
+          if (V.status[g[k + 1]] === 'Angebot') angebot += g[k + 3];
+        }
+        return [n, angebot];
+      }
+
+      function clusterMarker(r) {
+        var c = clusterCounts(r);
+        if (!c[0]) return null;
+        var marker = L.marker([r[0], r[1]], { icon: window.projectClusterIcon(V.category[r[2]], c[0], c[1]) });
+        marker.on('click', function() {
+          map.setView([r[0], r[1]], Math.min(map.getZoom() + 2, H.maxZoom + 1));
+        });
+        return marker;
+      }
+
+      function render() {
+        var z = levelFor(map.getZoom());
+        var rows = [];
+        var pending = false;
+        if (z <= H.embedZoom) {
+          rows = H.levels[z] || [];
+        } else {
+          visibleBlocks(z).forEach(function(key) {
+            loadBlock(key);
+            if (blocks[key]) rows = rows.concat(blocks[key]);
+            else pending = true;
+          });
+        }
+        // Während des Nachladens die alte Darstellung stehen lassen statt leerer Karte
+        if (pending && !rows.length) return;
+
+        layer.clearLayers();
+        rows.forEach(function(r) {
+          if (z > H.maxZoom) {
+            if (r.visible) layer.addLayer(r.layer);
+          } else {
+            var marker = clusterMarker(r);
+            if (marker) layer.addLayer(marker);
+          }
+        });
+      }
+
+      map.on('moveend', render);
+      render();
+
+      // Sidebar: Gesamtzahl aus der gröbsten Stufe, Sichtbarkeit über render()
+      window.PROJECT_COUNT = function() {
+        return (H.levels[H.minZoom] || []).reduce(function(sum, r) { return sum + clusterCounts(r)[0]; }, 0);
+      };
+      window.PROJECT_SET_VISIBLE = function() {};
+      window.PROJECT_FILTER_CHANGED = render;
+      window.PROJECT_FOCUS = function(entry, done) {
+        map.setView([entry.p.lat, entry.p.lon], Math.max(map.getZoom(), H.maxZoom + 1));
+        render();
+        done();
+      };
+      window.PROJECT_LAYER = layer;
+      window.PROJECT_ENTRIES = entries;
+    });
+    """
+    return (
+        js.replace("__MAP__", map_name)
+        .replace("__DATA__", data)
+        .replace("__BLOCK_URL__", json.dumps(block_url))
+        .replace("__BLOCK_CALLBACK__", BLOCK_CALLBACK)
+    )
+
 # ======================================================
 # MAIN
 # ======================================================
 def main():
+    if os.getenv("GEOCODE_WARMUP", "False").strip().lower() in {"true", "1", "yes", "ja"}:
+        warm_up_geocoder()
+
     # ---------- MAP (Deutschland als Basis-Zoom) ----------
     states = gpd.read_file(GERMANY_GEOJSON_PATH)
     m = folium.Map(tiles=None, zoom_control=True)
@@ -308,7 +1045,7 @@ def main():
         box-shadow:0 4px 12px rgba(0,0,0,.22);
         transition: transform .15s ease, box-shadow .2s ease;
     }}
-    .pin img {{
+    .pin .plant-icon {{
         width:{ICON_SIZE}px;
         height:{ICON_SIZE}px;
         display:block;
@@ -324,6 +1061,42 @@ def main():
         100% {{ box-shadow: 0 0 0 0 rgba(51,154,240,0), 0 10px 24px rgba(0,0,0,.18); }}
     }}
 
+    /* ===== Level of Detail: Klasse lod-dots am Karten-Container (unter LOD_ZOOM) ===== */
+    .lod-dots .pin {{
+        width:{DOT_SIZE}px;
+        height:{DOT_SIZE}px;
+        /* gleiche Mitte wie der Pin (Rahmen 2px statt 3px) */
+        margin:{(PIN_SIZE - DOT_SIZE) // 2 + 1}px;
+        border-width:2px;
+        background:var(--cat);
+        box-shadow:0 1px 3px rgba(0,0,0,.3);
+    }}
+    .lod-dots .pin .plant-icon {{
+        display:none;
+    }}
+
+    /* ===== Projekt-Cluster (RENDER_MODE=cluster): Füllung Kategorie, Ring Status-Anteile ===== */
+    .project-cluster {{
+        border-radius:50%;
+        display:flex;
+        align-items:center;
+        justify-content:center;
+        box-shadow:0 4px 12px rgba(0,0,0,.22);
+    }}
+    .project-cluster span {{
+        width:calc(100% - 8px);
+        height:calc(100% - 8px);
+        border-radius:50%;
+        background:var(--cat);
+        color:#ffffff;
+        font-size:12px;
+        font-weight:700;
+        display:flex;
+        align-items:center;
+        justify-content:center;
+        text-shadow:0 1px 2px rgba(0,0,0,.35);
+    }}
+
     /* ===== Popups ===== */
     .popup {{
         min-width: 460px;
@@ -661,147 +1434,39 @@ def main():
     # ======================================================
     # PROJEKTE - Lade Daten (Excel oder Datenbank)
     # ======================================================
-    print(f"\n📊 Datenquelle: {get_data_source().upper()}")
-    
-    try:
-        projects_dict = load_projects()
-    except Exception as e:
-        print(f"❌ Fehler beim Laden der Projekte: {e}")
-        print(f"   Fallback auf Excel: {EXCEL_PATH}")
-        try:
-            xls = pd.ExcelFile(EXCEL_PATH)
-            projects_dict = {sheet: pd.read_excel(xls, sheet_name=sheet) for sheet in xls.sheet_names}
-        except Exception as e2:
-            print(f"❌ Auch Excel-Fallback fehlgeschlagen: {e2}")
-            projects_dict = {}
-
-    pid_counter = 0
-
-    for sheet, df in projects_dict.items():
-        if sheet not in CATEGORY_COLOR:
-            continue
-        
-        if df.empty:
-            continue
-
-        required = {"Art", "VN", "Name", "Status", "PLZ"}
-        if not required.issubset(df.columns):
-            print(f"⚠ Sheet '{sheet}' hat nicht alle erforderlichen Spalten: {required}")
-            continue
-
-        has_kunde = "Kunde" in df.columns
-        has_messtechnik = "Messtechnik eingebaut" in df.columns
-        has_land = "Land" in df.columns
-
-        df["PLZ"] = (
-            df["PLZ"].astype(str)
-            .str.replace(r"\.0$", "", regex=True)
-            .str.strip()
-        )
-
-        # Optional: Land -> country code
-        if has_land:
-            df["_CC"] = df["Land"].apply(normalize_country_for_pgeocode)
-        else:
-            df["_CC"] = "DE"
-
-        # PLZ in vielen Ländern nicht immer 5-stellig – für DE ist das wichtig
-        # Wir zfill nur bei DE, sonst lassen wir es so.
-        df["_PLZ"] = df["PLZ"].copy()
-        df.loc[df["_CC"] == "DE", "_PLZ"] = df.loc[df["_CC"] == "DE", "_PLZ"].astype(str).str.zfill(5)
-
-        # Geocoding: pro CountryCode gruppieren (pgeocode)
-        lat_all = [None] * len(df)
-        lon_all = [None] * len(df)
-
-        for cc, idxs in df.groupby("_CC").groups.items():
-            try:
-                geo = pgeocode.Nominatim(cc)
-                codes = df.loc[idxs, "_PLZ"].astype(str).tolist()
-                loc = geo.query_postal_code(codes)
-                lat_vals = loc["latitude"].values
-                lon_vals = loc["longitude"].values
-                for j, ridx in enumerate(idxs):
-                    lat_all[ridx] = lat_vals[j]
-                    lon_all[ridx] = lon_vals[j]
-            except Exception:
-                # Fallback: nichts setzen (wird später dropna)
-                continue
-
-        df["lat"] = lat_all
-        df["lon"] = lon_all
-        df = df.dropna(subset=["lat", "lon"]).reset_index(drop=True)
-
-        offsets = spiral(len(df), JITTER_STEP_M)
-
-        for i, row in df.iterrows():
-            # Messtechnik eingebaut: wenn "nein" => ausblenden, sonst anzeigen
-            if has_messtechnik and hide_if_messtechnik_eingebaut_nein(row["Messtechnik eingebaut"]):
-                continue
-
-            plant = safe_str(row["Art"], "").replace("\xa0", "").strip()
-            if plant not in PLANT_ICONS:
-                continue
-
-            status = normalize_status(row["Status"])
-            status_color = STATUS_RING_COLOR[status]
-
-            name = safe_str(row["Name"])
-            vn = safe_str(row["VN"])
-            kunde = safe_str(row["Kunde"]) if has_kunde else "—"
-
-            lat = float(row["lat"])
-            lon = float(row["lon"])
-
-            img = image_to_base64(PLANT_ICONS[plant])
-            dlat, dlon = meters_to_deg(lat, offsets[i][0], offsets[i][1])
-
-            pid = f"proj-{pid_counter}"
-            pid_counter += 1
-
-            badge_class = "angebot" if status == "Angebot" else "auftrag"
-            status_badge = f"<span class='badge {badge_class}'>{status}</span>"
-
-            popup_html = f"""
-            <div class="popup">
-              <h3>{name}</h3>
-              <div class="row"><div class="k">Kunde</div><div class="v">{kunde}</div></div>
-              <div class="row"><div class="k">VN</div><div class="v">{vn}</div></div>
-              <div class="row"><div class="k">Status</div><div class="v">{status_badge}</div></div>
-              <div class="row"><div class="k">Kategorie</div><div class="v">{sheet}</div></div>
-              <div class="row"><div class="k">Kraftwerksart</div><div class="v">{plant}</div></div>
-              <div class="row"><div class="k">PLZ</div><div class="v">{safe_str(row['PLZ'])}</div></div>
-            </div>
-            """
-
-            country = safe_str(row["_CC"], "DE") if "_CC" in row else "DE"
-
-            icon_html = f"""
-            <div class="pin project-marker"
-                 data-id="{pid}"
-                 data-category="{sheet}"
-                 data-plant="{plant}"
-                 data-name="{name}"
-                 data-vn="{vn}"
-                 data-kunde="{kunde}"
-                 data-status="{status}"
-                 data-country="{country}"
-                 data-lat="{lat + dlat}"
-                 data-lon="{lon + dlon}"
-                 style="--status:{status_color}">
-                <img src="{img}">
-            </div>
-            """
-
-            folium.Marker(
-                [lat + dlat, lon + dlon],
-                popup=folium.Popup(popup_html, max_width=580),
-                icon=folium.DivIcon(
-                    html=icon_html,
-                    icon_size=(PIN_SIZE, PIN_SIZE),
-                    icon_anchor=(PIN_SIZE // 2, PIN_SIZE // 2),
-                ),
-            ).add_to(m)
+    projects_source = load_project_source()
+
+    geocode_cache = open_geocode_cache()
+
+    frames = iter_project_frames(projects_source, geocode_cache)
+    records = iter_project_records(frames)
+    m.get_root().html.add_child(Element(project_popup_js(m.get_name())))
+    # Icons: ein Sprite-Atlas für alle Arten statt Data-URI in jedem Pin
+    atlas, icon_urls = plant_icon_atlas()
+    if RENDER_MODE in ("data", "cluster", "canvas"):
+        payload = project_data_payload(records)
+        if RENDER_MODE == "cluster":
+            MarkerClusterAssets().add_to(m)
+        icons = canvas_icon_atlas(atlas, icon_urls) if RENDER_MODE == "canvas" else None
+        m.get_root().script.add_child(Element(project_layer_js(payload, m.get_name(), RENDER_MODE, icons)))
+        print(f"🗺 Daten-Layer ({RENDER_MODE}): {payload['count']} Projekte")
+    elif RENDER_MODE == "hierarchy":
+        hierarchy = build_hierarchy(records, max_zoom=CLUSTER_MAX_ZOOM, cell_px=CLUSTER_RADIUS)
+        block_dir = OUT_HTML.parent / f"{OUT_HTML.stem}_clusters"
+        export = export_hierarchy(hierarchy, fit_zoom([[miny, minx], [maxy, maxx]]), block_dir)
+        m.get_root().script.add_child(Element(project_hierarchy_js(export, m.get_name(), block_dir.name)))
+        print(f"🗺 Cluster-Hierarchie: {len(hierarchy['points'])} Projekte, "
+              f"bis Zoom {export['embedZoom']} eingebettet, {export['blocks']} Blöcke in {block_dir}")
+    else:
+        for rec in records:
+            project_marker(rec).add_to(m)
+
+    # Canvas zeichnet die Icons selbst, alle anderen Modi nutzen das Atlas-CSS
+    if RENDER_MODE != "canvas":
+        m.get_root().header.add_child(Element(plant_icon_css(atlas, icon_urls)))
+
+    if geocode_cache is not None:
+        geocode_cache.close()
 
     # ======================================================
     # RIGHT SIDEBAR (Filter + Projektliste + Highlight + Popup open robust)
@@ -849,6 +1514,7 @@ def main():
       "Angebot": "__COLOR_ANGEBOT__",
       "Auftrag": "__COLOR_AUFTRAG__"
     };
+    const LIST_LIMIT = __LIST_LIMIT__;
 
     function getLeafletMapInstance() {
       for (var k in window) {
@@ -860,23 +1526,51 @@ def main():
       return null;
     }
 
-    function markerIconElement(markerDiv) {
-      return markerDiv.closest('.leaflet-marker-icon');
+    // Projekt-Registry: ein Eintrag {p: Datensatz, layer: L.Marker, visible} pro Projekt.
+    // Daten-/Cluster-Layer liefern window.PROJECT_ENTRIES, Folium-Marker
+    // (RENDER_MODE=markers) werden einmalig aus dem DOM eingesammelt.
+    var PROJECTS = null;
+    var ACTIVE_ENTRY = null;
+
+    function projectEntries() {
+      if (PROJECTS) return PROJECTS;
+      if (window.PROJECT_ENTRIES) {
+        PROJECTS = window.PROJECT_ENTRIES;
+        return PROJECTS;
+      }
+      PROJECTS = [];
+      var map = getLeafletMapInstance();
+      if (!map) return PROJECTS;
+      map.eachLayer(function(layer){
+        if (!(layer instanceof L.Marker) || !layer._icon) return;
+        var el = layer._icon.querySelector('.project-marker');
+        if (el) PROJECTS.push({ p: el.dataset, layer: layer, visible: true });
+      });
+      return PROJECTS;
     }
 
-    function setMarkerVisible(markerDiv, visible) {
-      var icon = markerIconElement(markerDiv);
-      if (!icon) return;
-      icon.style.display = visible ? '' : 'none';
+    // Pin-Element eines Eintrags (null, solange der Pin in einem Cluster steckt)
+    function markerElement(entry) {
+      var icon = entry.layer && entry.layer._icon;
+      return icon ? icon.querySelector('.project-marker') : null;
     }
 
-    function isMarkerVisible(markerDiv) {
-      var icon = markerIconElement(markerDiv);
-      if (!icon) return false;
-      return icon.style.display !== 'none';
+    // changes: [[entry, sichtbar], ...]; Cluster-Layer ersetzen das über window.PROJECT_SET_VISIBLE
+    function setProjectsVisible(changes) {
+      if (!changes.length) return;
+      if (window.PROJECT_SET_VISIBLE) {
+        window.PROJECT_SET_VISIBLE(changes);
+        return;
+      }
+      changes.forEach(function(c){
+        var icon = c[0].layer && c[0].layer._icon;
+        if (icon) icon.style.display = c[1] ? '' : 'none';
+      });
     }
 
     function clearActive() {
+      if (ACTIVE_ENTRY && window.PROJECT_HIGHLIGHT) window.PROJECT_HIGHLIGHT(ACTIVE_ENTRY, false);
+      ACTIVE_ENTRY = null;
       document.querySelectorAll('.pin.active').forEach(function(p){ p.classList.remove('active'); });
       document.querySelectorAll('.project-item.active').forEach(function(i){ i.classList.remove('active'); });
     }
@@ -890,20 +1584,30 @@ def main():
         .toLocaleLowerCase("de-DE");
     }
 
-    // Robust: finde Leaflet Marker-Objekt über DOM (popup öffnen zuverlässig auch nach Drag)
-    function findLeafletMarkerById(pid) {
-      var map = getLeafletMapInstance();
-      if (!map || !map._layers) return null;
-
-      for (var id in map._layers) {
-        var layer = map._layers[id];
-        if (!layer) continue;
-        if (layer instanceof L.Marker && layer._icon) {
-          var el = layer._icon.querySelector('.project-marker[data-id="' + pid + '"]');
-          if (el) return layer;
+    // Pin zeigen, hervorheben und Popup öffnen (Cluster: vorher bis zum Pin aufzoomen)
+    function focusProject(entry) {
+      function open() {
+        var el = markerElement(entry);
+        if (window.PROJECT_HIGHLIGHT) window.PROJECT_HIGHLIGHT(entry, true);
+        else if (el) el.classList.add('active');
+        if (entry.layer && typeof entry.layer.openPopup === "function") {
+          entry.layer.openPopup();
         }
       }
-      return null;
+
+      if (window.PROJECT_FOCUS) {
+        window.PROJECT_FOCUS(entry, open);
+        return;
+      }
+
+      var map = getLeafletMapInstance();
+      var lat = parseFloat(entry.p.lat);
+      var lon = parseFloat(entry.p.lon);
+      if (map && !isNaN(lat) && !isNaN(lon)) {
+        var z = Math.max(map.getZoom(), 7);
+        map.setView([lat, lon], z, { animate: true });
+      }
+      open();
     }
 
     function buildProjectList() {
@@ -913,35 +1617,35 @@ def main():
 
       list.innerHTML = '';
 
-      var markers = Array.from(document.querySelectorAll('.project-marker'))
-        .filter(function(m){ return isMarkerVisible(m); });
+      var entries = projectEntries().filter(function(e){ return e.visible; });
 
-      markers.sort(function(a,b){
-        return sortKeyName(a.dataset.name).localeCompare(sortKeyName(b.dataset.name), "de-DE");
+      entries.sort(function(a,b){
+        return sortKeyName(a.p.name).localeCompare(sortKeyName(b.p.name), "de-DE");
       });
 
-      markers.forEach(function(m){
+      entries.slice(0, LIST_LIMIT).forEach(function(e){
+        var d = e.p;
         var item = document.createElement('div');
         item.className = 'project-item';
-        item.dataset.target = m.dataset.id;
+        item.dataset.target = d.id;
 
         var left = document.createElement('div');
         left.style.minWidth = '0';
 
         var name = document.createElement('div');
         name.className = 'project-name';
-        name.textContent = m.dataset.name || 'Unbenannt';
+        name.textContent = d.name || 'Unbenannt';
 
         var meta = document.createElement('div');
         meta.className = 'project-meta';
 
         var vn = document.createElement('span');
-        vn.textContent = m.dataset.vn ? ('VN ' + m.dataset.vn) : '';
+        vn.textContent = d.vn ? ('VN ' + d.vn) : '';
 
         var statusWrap = document.createElement('span');
         statusWrap.className = 'meta-status';
 
-        var statusText = (m.dataset.status || '').trim() || 'Auftrag';
+        var statusText = (d.status || '').trim() || 'Auftrag';
         var dot = document.createElement('span');
         dot.className = 'status-dot-list';
         dot.style.setProperty('--statuscolor', STATUS_COLORS[statusText] || STATUS_COLORS["Auftrag"]);
@@ -960,57 +1664,82 @@ def main():
 
         var pill = document.createElement('span');
         pill.className = 'small-pill';
-        pill.textContent = m.dataset.category || '';
+        pill.textContent = d.category || '';
 
         item.appendChild(left);
         item.appendChild(pill);
 
         item.addEventListener('click', function(){
           clearActive();
+          ACTIVE_ENTRY = e;
           item.classList.add('active');
-          m.classList.add('active');
-
-          var map = getLeafletMapInstance();
-          var lat = parseFloat(m.dataset.lat);
-          var lon = parseFloat(m.dataset.lon);
-
-          if (map && !isNaN(lat) && !isNaN(lon)) {
-            var z = Math.max(map.getZoom(), 7);
-            map.setView([lat, lon], z, { animate: true });
-          }
-
-          // ✅ Popup zuverlässig öffnen
-          var leaf = findLeafletMarkerById(m.dataset.id);
-          if (leaf && typeof leaf.openPopup === "function") {
-            leaf.openPopup();
-          }
+          focusProject(e);
         });
 
         list.appendChild(item);
       });
 
-      if (count) count.textContent = String(markers.length);
+      // Hierarchie-Modus: nur geladene Projekte sind bekannt, die Gesamtzahl kommt aus den Clustern
+      var total = window.PROJECT_COUNT ? window.PROJECT_COUNT() : entries.length;
+      var shown = Math.min(entries.length, LIST_LIMIT);
+      if (total > shown) {
+        var more = document.createElement('div');
+        more.className = 'project-meta';
+        more.style.padding = '8px 10px';
+        more.textContent = '… ' + (total - shown) + ' weitere - '
+          + (entries.length > LIST_LIMIT ? 'Filter eingrenzen' : 'zum Anzeigen hineinzoomen');
+        list.appendChild(more);
+      }
+
+      if (count) count.textContent = String(total);
     }
 
-    function applyFiltersAndRefreshList() {
+    // Aktueller Filterzustand als Funktion p -> sichtbar (p: category, plant, country)
+    function projectFilter() {
       var cats = Array.from(document.querySelectorAll('.f-cat:checked')).map(function(e){ return e.value; });
       var plants = Array.from(document.querySelectorAll('.f-plant:checked')).map(function(e){ return e.value; });
+      var euVisible = window.EU_VISIBLE || new Set();
 
-      document.querySelectorAll('.project-marker').forEach(function(m){
-        var countryCode = m.dataset.country || 'DE';
-        var countryVisible = (countryCode === 'DE') || EU_VISIBLE.has(getCountryNameFromCode(countryCode));
-        var filterPass = cats.includes(m.dataset.category) && plants.includes(m.dataset.plant);
-        var show = filterPass && countryVisible;
-        setMarkerVisible(m, show);
+      return function(p) {
+        var countryCode = p.country || 'DE';
+        var countryVisible = (countryCode === 'DE') || euVisible.has(getCountryNameFromCode(countryCode));
+        var filterPass = cats.includes(p.category) && plants.includes(p.plant);
+        return filterPass && countryVisible;
+      };
+    }
+
+    function applyFiltersAndRefreshList() {
+      var passes = projectFilter();
+      window.projectPasses = passes;
+
+      var changes = [];
+      projectEntries().forEach(function(e){
+        var show = passes(e.p);
+        if (show !== e.visible) {
+          e.visible = show;
+          changes.push([e, show]);
+        }
       });
+      setProjectsVisible(changes);
+      if (window.PROJECT_FILTER_CHANGED) window.PROJECT_FILTER_CHANGED();
 
-      var active = document.querySelector('.pin.active');
-      if (active && !isMarkerVisible(active)) {
+      if (ACTIVE_ENTRY && !ACTIVE_ENTRY.visible) {
         clearActive();
       }
 
       buildProjectList();
     }
+
+    // Mehrere Änderungen kurz hintereinander (z.B. alle Nachbarländer) -> ein Durchlauf
+    var refreshPending = false;
+    function refreshProjectsSoon() {
+      if (refreshPending) return;
+      refreshPending = true;
+      setTimeout(function(){
+        refreshPending = false;
+        applyFiltersAndRefreshList();
+      }, 0);
+    }
     
     function getCountryNameFromCode(code) {
       // Umkehrung: Code -> Name
@@ -1032,7 +1761,7 @@ def main():
     function waitForMarkersThenInit(retries) {
       if (retries === undefined) retries = 60;
       var markers = document.querySelectorAll('.project-marker');
-      if (markers && markers.length > 0) {
+      if (window.PROJECT_ENTRIES || (markers && markers.length > 0)) {
         initSidebar();
         return;
       }
@@ -1052,6 +1781,7 @@ def main():
         menu_html
         .replace("__COLOR_ANGEBOT__", STATUS_RING_COLOR["Angebot"])
         .replace("__COLOR_AUFTRAG__", STATUS_RING_COLOR["Auftrag"])
+        .replace("__LIST_LIMIT__", str(PROJECT_LIST_LIMIT))
     )
     m.get_root().html.add_child(Element(menu_html))
 
@@ -1312,16 +2042,8 @@ def main():
           addCapital(countryName);
           window.EU_VISIBLE.add(countryName);
           
-          // Zeige auch Projekte in diesem Land
-          const countryCode = getCountryCode(countryName);
-          document.querySelectorAll('.project-marker[data-country="' + countryCode + '"]').forEach(function(markerDiv) {{
-            if (markerDiv) {{
-              setMarkerVisible(markerDiv, true);
-            }}
-          }});
-          
-          // Aktualisiere Projektliste
-          buildProjectList();
+          // Zeige auch Projekte in diesem Land (Filter + Projektliste, über die Projekt-Registry)
+          refreshProjectsSoon();
         }}
 
         function hideCountry(countryName) {{
@@ -1335,16 +2057,8 @@ def main():
           removeCapital(countryName);
           window.EU_VISIBLE.delete(countryName);
           
-          // Verstecke auch Projekte in diesem Land
-          const countryCode = getCountryCode(countryName);
-          document.querySelectorAll('.project-marker[data-country="' + countryCode + '"]').forEach(function(markerDiv) {{
-            if (markerDiv) {{
-              setMarkerVisible(markerDiv, false);
-            }}
-          }});
-          
-          // Aktualisiere Projektliste
-          buildProjectList();
+          // Verstecke auch Projekte in diesem Land (Filter + Projektliste, über die Projekt-Registry)
+          refreshProjectsSoon();
         }}
 
         function toggleCountry(countryName) {{
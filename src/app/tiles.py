@@ -0,0 +1,546 @@
+"""
+Tile-Export - Projekte und Grenzen als Kachel-Pyramide (gekacheltes GeoJSON)
+Kacheln im XYZ-Schema (wie OSM/Leaflet), pro Kachel ein JSON:
+    {"projects": [...], "germany": [Feature, ...], "europe": [Feature, ...]}
+
+Projekte: bis CLUSTER_MAX_ZOOM die Cluster aus clustering.py, eine Stufe
+darüber die Einzelprojekte. Grenzen: bis BOUNDARY_MAX_ZOOM pro Stufe
+vereinfacht (~1 Pixel) und auf die Kachel zugeschnitten. Über den jeweils
+letzten Stufen zeichnet der Viewer aus der Eltern-Kachel (Overzoom) - die
+Pyramide bleibt klein, die Datenmenge pro Ansicht hängt nur vom Ausschnitt ab.
+
+Ausgabe als Ordner (<z>/<x>/<y>.json + index.html mit L.GridLayer) oder als
+MBTiles (SQLite, format=json; Auslieferung über einen Tile-Server).
+
+Nutzung:
+    python src/app/tiles.py export                     # Ordner TILE_DIR (Default: tiles/)
+    python src/app/tiles.py export --out /srv/karte
+    python src/app/tiles.py export --mbtiles karte.mbtiles
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.geometry import mapping
+
+try:
+    from .main import (
+        load_project_source, iter_project_frames, iter_project_records, project_popup_js,
+        BASE_DIR, GERMANY_GEOJSON_PATH, EUROPE_GEOJSON_PATH, EUROPEAN_COUNTRIES, COUNTRY_COLORS,
+        CATEGORY_COLOR, STATUS_RING_COLOR, PIN_SIZE, CLUSTER_RADIUS, CLUSTER_MAX_ZOOM,
+    )
+    from .geocoding import open_geocode_cache
+    from .clustering import build_hierarchy, cluster_rows, point_rows, world_px, TILE_SIZE
+except ImportError:
+    from main import (
+        load_project_source, iter_project_frames, iter_project_records, project_popup_js,
+        BASE_DIR, GERMANY_GEOJSON_PATH, EUROPE_GEOJSON_PATH, EUROPEAN_COUNTRIES, COUNTRY_COLORS,
+        CATEGORY_COLOR, STATUS_RING_COLOR, PIN_SIZE, CLUSTER_RADIUS, CLUSTER_MAX_ZOOM,
+    )
+    from geocoding import open_geocode_cache
+    from clustering import build_hierarchy, cluster_rows, point_rows, world_px, TILE_SIZE
+
+DEFAULT_TILE_DIR = BASE_DIR / "tiles"
+
+# Grenzen ab hier nur noch per Overzoom (Europa auf z8: ~1.500 Kacheln)
+BOUNDARY_MAX_ZOOM = 8
+
+# Projekte nahe am Kachelrand landen auch in der Nachbarkachel (Cluster-Kreise nicht abschneiden)
+TILE_BUFFER_PX = 32
+
+# Kennung in metadata.json bzw. der MBTiles-Tabelle metadata: nur so markierte
+# Ausgaben werden bei einem neuen Export ersetzt
+GENERATOR = "deutschlandkarte-tiles"
+
+GERMANY_FILL = "#f8f9fa"
+EUROPE_DEFAULT_FILL = "#e5f5e0"
+
+LEAFLET_JS = "https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"
+LEAFLET_CSS = "https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css"
+
+
+def get_tile_dir() -> Path:
+    """TILE_DIR aus .env oder Default <BASE_DIR>/tiles"""
+    v = os.getenv("TILE_DIR", "").strip()
+    return Path(v).expanduser().resolve() if v else DEFAULT_TILE_DIR
+
+
+def tile_bounds(z: int, x: int, y: int, buffer_px: float = 0):
+    """(west, south, east, north) einer XYZ-Kachel, optional um buffer_px erweitert"""
+    n = 2.0 ** z
+    b = buffer_px / TILE_SIZE
+
+    def lon(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return lon(x - b), lat(y + 1 + b), lon(x + 1 + b), lat(y - b)
+
+
+# ======================================================
+# AUSGABE (Ordner oder MBTiles)
+# ======================================================
+class DirectoryTiles:
+    """<out>/<z>/<x>/<y>.json - direkt per HTTP auslieferbar"""
+
+    def __init__(self, out_dir: Path):
+        self.out_dir = Path(out_dir)
+        meta_path = self.out_dir / "metadata.json"
+        if self.out_dir.exists() and any(self.out_dir.iterdir()):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    ours = json.load(f).get("generator") == GENERATOR
+            except (OSError, ValueError, AttributeError):
+                ours = False
+            if not ours:
+                raise FileExistsError(
+                    f"{self.out_dir} ist nicht leer und stammt nicht vom Kachel-Export "
+                    f"(metadata.json ohne generator={GENERATOR}) - bitte anderen Ordner wählen"
+                )
+            for z_dir in self.out_dir.iterdir():
+                if z_dir.is_dir() and z_dir.name.isdigit():
+                    shutil.rmtree(z_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        # Markierung vor der ersten Kachel: auch ein abgebrochener Export gilt als eigener Ordner
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"generator": GENERATOR, "complete": False}, f)
+        self.count = 0
+
+    def write(self, z: int, x: int, y: int, data: bytes) -> None:
+        path = self.out_dir / str(z) / str(x) / f"{y}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        self.count += 1
+
+    def close(self, metadata: dict) -> None:
+        with open(self.out_dir / "metadata.json", "w", encoding="utf-8") as f:
+            json.dump({"generator": GENERATOR, "complete": True, **metadata}, f, ensure_ascii=False, indent=2)
+
+
+class MBTiles:
+    """MBTiles 1.3 (SQLite), tile_row im TMS-Schema (y von unten)"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            if not self._is_ours(self.path):
+                raise FileExistsError(
+                    f"{self.path} existiert und stammt nicht vom Kachel-Export "
+                    f"(kein metadata-Eintrag generator={GENERATOR}) - bitte anderen Pfad wählen"
+                )
+            self.path.unlink()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)"
+        )
+        self.conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        # Markierung sofort festschreiben (abgebrochener Export bleibt ersetzbar)
+        self.conn.execute("INSERT INTO metadata VALUES ('generator', ?)", (GENERATOR,))
+        self.conn.commit()
+        self.count = 0
+
+    @staticmethod
+    def _is_ours(path: Path) -> bool:
+        """True, wenn die Datei eine MBTiles-Datei dieses Exports ist"""
+        try:
+            conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+            try:
+                row = conn.execute("SELECT value FROM metadata WHERE name = 'generator'").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+        return row is not None and row[0] == GENERATOR
+
+    def write(self, z: int, x: int, y: int, data: bytes) -> None:
+        self.conn.execute(
+            "INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, sqlite3.Binary(data))
+        )
+        self.count += 1
+
+    def close(self, metadata: dict) -> None:
+        rows = {
+            "name": "Projekte",
+            "format": "json",
+            "type": "overlay",
+            "minzoom": str(metadata["minZoom"]),
+            "maxzoom": str(metadata["maxZoom"]),
+            "bounds": ",".join(str(round(v, 6)) for v in metadata["bounds"]),
+            "json": json.dumps(metadata, ensure_ascii=False),
+        }
+        self.conn.executemany("INSERT INTO metadata VALUES (?, ?)", rows.items())
+        self.conn.commit()
+        self.conn.close()
+
+
+# ======================================================
+# INHALT
+# ======================================================
+def load_boundaries() -> dict:
+    """{"germany": GeoDataFrame(name, fill, geometry), "europe": ...} - wie in main() gefiltert"""
+    layers = {}
+    if GERMANY_GEOJSON_PATH.exists():
+        states = gpd.read_file(GERMANY_GEOJSON_PATH)
+        layers["germany"] = gpd.GeoDataFrame(
+            {"name": states.get("name", ""), "fill": GERMANY_FILL}, geometry=states.geometry, crs=states.crs
+        )
+    if EUROPE_GEOJSON_PATH.exists():
+        eu = gpd.read_file(EUROPE_GEOJSON_PATH)
+        names = eu["ADMIN"].astype(str).str.strip()
+        keep = names.isin(EUROPEAN_COUNTRIES) & ~names.str.lower().isin({"germany", "deutschland"})
+        eu, names = eu[keep], names[keep]
+        layers["europe"] = gpd.GeoDataFrame(
+            {"name": names, "fill": names.map(lambda c: COUNTRY_COLORS.get(c, EUROPE_DEFAULT_FILL))},
+            geometry=eu.geometry, crs=eu.crs,
+        )
+    return {k: v.to_crs(4326).reset_index(drop=True) for k, v in layers.items()}
+
+
+def boundary_tiles(gdf: gpd.GeoDataFrame, z: int) -> dict:
+    """{(x, y): [Feature, ...]} - auf ~1 Pixel vereinfacht und pro Kachel zugeschnitten"""
+    deg_per_px = 360.0 / (TILE_SIZE * 2 ** z)
+    geoms = shapely.set_precision(gdf.geometry.simplify(deg_per_px, preserve_topology=True).values, deg_per_px / 4)
+    tree = shapely.STRtree(geoms)
+
+    west, south, east, north = gdf.total_bounds
+    (x0, x1), (y0, y1) = world_px([north, south], [west, east], z)
+    tiles = {}
+    for x in range(int(x0 // TILE_SIZE), int(x1 // TILE_SIZE) + 1):
+        for y in range(int(y0 // TILE_SIZE), int(y1 // TILE_SIZE) + 1):
+            box = tile_bounds(z, x, y, buffer_px=2)
+            features = []
+            for i in tree.query(shapely.box(*box)):
+                clipped = shapely.clip_by_rect(geoms[i], *box)
+                if clipped.is_empty:
+                    continue
+                features.append({
+                    "type": "Feature",
+                    "properties": {"name": gdf["name"].iat[i], "fill": gdf["fill"].iat[i]},
+                    "geometry": mapping(clipped),
+                })
+            if features:
+                tiles[(x, y)] = features
+    return tiles
+
+
+def project_tiles(frame, z: int, rows_fn) -> dict:
+    """{(x, y): Zeilen} - jede Zeile in allen Kacheln, deren Rand-Puffer sie berührt"""
+    if not len(frame):
+        return {}
+    px, py = world_px(frame["lat"], frame["lon"], z)
+    b = TILE_BUFFER_PX
+    tiles = {}
+    for dx in (-b, b):
+        for dy in (-b, b):
+            tx = np.floor((px + dx) / TILE_SIZE).astype("int64")
+            ty = np.floor((py + dy) / TILE_SIZE).astype("int64")
+            for key, idx in frame.groupby([tx, ty]).indices.items():
+                tiles.setdefault((int(key[0]), int(key[1])), set()).update(idx.tolist())
+    return {key: rows_fn(frame.iloc[sorted(idx)]) for key, idx in tiles.items()}
+
+
+def export_tiles(records, sink, max_zoom: int = CLUSTER_MAX_ZOOM, min_zoom: int = 0) -> dict:
+    """
+    Schneidet Projekte und Grenzen in die Kachel-Pyramide
+
+    Args:
+        records: Projekt-Dicts (iter_project_records)
+        sink: DirectoryTiles oder MBTiles
+        max_zoom: letzte Cluster-Stufe (Einzelprojekte auf max_zoom + 1)
+
+    Returns:
+        Metadaten (auch als metadata.json / MBTiles-Metadaten abgelegt)
+    """
+    hierarchy = build_hierarchy(records, max_zoom=max_zoom, min_zoom=min_zoom, cell_px=CLUSTER_RADIUS)
+    boundaries = load_boundaries()
+    project_zoom = max_zoom + 1
+    boundary_zoom = min(BOUNDARY_MAX_ZOOM, project_zoom)
+
+    for z in range(min_zoom, project_zoom + 1):
+        if z <= max_zoom:
+            content = {"projects": project_tiles(hierarchy["levels"][z], z, cluster_rows)}
+        else:
+            content = {"projects": project_tiles(hierarchy["points"], z, point_rows)}
+        if z <= boundary_zoom:
+            for name, gdf in boundaries.items():
+                content[name] = boundary_tiles(gdf, z)
+
+        keys = set().union(*(layer.keys() for layer in content.values()))
+        for x, y in sorted(keys):
+            tile = {name: layer.get((x, y), []) for name, layer in content.items()}
+            sink.write(z, x, y, json.dumps(tile, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        print(f"   z{z:>2}: {len(keys)} Kacheln")
+
+    if "germany" in boundaries:
+        bounds = [float(v) for v in boundaries["germany"].total_bounds]
+    else:
+        bounds = [5.87, 47.27, 15.04, 55.06]
+    metadata = {
+        "minZoom": min_zoom,
+        "maxZoom": project_zoom,
+        "clusterMaxZoom": max_zoom,
+        "boundaryMaxZoom": boundary_zoom,
+        "bounds": bounds,
+        "values": hierarchy["values"],
+        "projects": int(len(hierarchy["points"])),
+        "tiles": sink.count,
+    }
+    sink.close(metadata)
+    return metadata
+
+
+# ======================================================
+# VIEWER (index.html im Kachel-Ordner)
+# ======================================================
+def viewer_html(metadata: dict) -> str:
+    """
+    Leaflet-Seite, die per L.GridLayer nur die Kacheln im Sichtbereich lädt
+
+    Jede Kachel ist ein <canvas> (Grenzen + Projekte), Klicks werden gegen
+    die geladenen Kachel-Daten getestet: Cluster zoomen hinein, Einzelprojekte
+    öffnen das gemeinsame Popup (buildPopupHtml aus main.project_popup_js).
+    """
+    js = """
+    var META = __META__;
+    var CATEGORY_COLOR = __CATEGORY_COLOR__;
+    var STATUS_RING = __STATUS_RING__;
+    var PIN = __PIN_SIZE__;
+    var V = META.values;
+
+    var b = META.bounds;
+    var map = L.map('map', { zoomControl: true, minZoom: META.minZoom })
+      .fitBounds([[b[1], b[0]], [b[3], b[2]]]);
+
+    var loaded = {};
+    var pending = {};
+
+    function tileKey(z, x, y) { return z + '/' + x + '/' + y; }
+
+    function fetchTile(c) {
+      var key = tileKey(c.z, c.x, c.y);
+      if (!pending[key]) {
+        pending[key] = fetch(key + '.json')
+          .then(function(r) { return r.ok ? r.json() : {}; })
+          .catch(function() { return {}; })
+          .then(function(data) { loaded[key] = data; return data; });
+      }
+      return pending[key];
+    }
+
+    // Overzoom: Daten der Eltern-Kachel auf Stufe nz
+    function sourceTile(c, nz) {
+      var d = c.z - nz;
+      return d <= 0 ? c : { z: nz, x: c.x >> d, y: c.y >> d };
+    }
+
+    function clusterRadius(n) {
+      var size = n < 10 ? PIN : (n < 100 ? PIN + 6 : (n < 1000 ? PIN + 12 : PIN + 18));
+      return size / 2;
+    }
+
+    function pointRecord(r) {
+      return {
+        category: V.category[r[0]], plant: V.plant[r[1]], status: V.status[r[2]], country: V.country[r[3]],
+        id: r[4], name: r[5], vn: r[6], kunde: r[7], plz: r[8], lat: r[9], lon: r[10]
+      };
+    }
+
+    function drawRings(ctx, pt, r, angebotShare, fill) {
+      var start = -Math.PI / 2, mid = start + angebotShare * 2 * Math.PI;
+      ctx.lineWidth = 4;
+      if (angebotShare > 0) {
+        ctx.strokeStyle = STATUS_RING['Angebot'];
+        ctx.beginPath(); ctx.arc(pt.x, pt.y, r - 2, start, mid); ctx.stroke();
+      }
+      if (angebotShare < 1) {
+        ctx.strokeStyle = STATUS_RING['Auftrag'];
+        ctx.beginPath(); ctx.arc(pt.x, pt.y, r - 2, mid, start + 2 * Math.PI); ctx.stroke();
+      }
+      ctx.fillStyle = fill;
+      ctx.beginPath(); ctx.arc(pt.x, pt.y, r - 4, 0, 2 * Math.PI); ctx.fill();
+    }
+
+    var ProjectTiles = L.GridLayer.extend({
+      createTile: function(coords, done) {
+        var tile = L.DomUtil.create('canvas', 'leaflet-tile');
+        var size = this.getTileSize();
+        var ratio = window.devicePixelRatio || 1;
+        tile.width = size.x * ratio;
+        tile.height = size.y * ratio;
+        var ctx = tile.getContext('2d');
+        ctx.scale(ratio, ratio);
+
+        var origin = coords.scaleBy(size);
+        function toPx(lat, lon) { return map.project([lat, lon], coords.z).subtract(origin); }
+
+        var bs = sourceTile(coords, META.boundaryMaxZoom);
+        var ps = sourceTile(coords, META.maxZoom);
+        Promise.all([fetchTile(bs), fetchTile(ps)]).then(function(res) {
+          ['europe', 'germany'].forEach(function(layer) {
+            (res[0][layer] || []).forEach(function(f) { drawFeature(ctx, f, toPx, layer); });
+          });
+          var rows = res[1].projects || [];
+          rows.forEach(function(r) {
+            if (ps.z > META.clusterMaxZoom) {
+              var p = pointRecord(r);
+              drawRings(ctx, toPx(p.lat, p.lon), PIN / 2 - 4, p.status === 'Angebot' ? 1 : 0,
+                CATEGORY_COLOR[p.category] || '#868e96');
+            } else {
+              var pt = toPx(r[0], r[1]), g = r[4], angebot = 0;
+              for (var k = 0; k < g.length; k += 4) {
+                if (V.status[g[k + 1]] === 'Angebot') angebot += g[k + 3];
+              }
+              var rad = clusterRadius(r[3]);
+              drawRings(ctx, pt, rad, angebot / r[3], CATEGORY_COLOR[V.category[r[2]]] || '#868e96');
+              ctx.fillStyle = '#ffffff';
+              ctx.font = 'bold 12px sans-serif';
+              ctx.textAlign = 'center';
+              ctx.textBaseline = 'middle';
+              ctx.fillText(String(r[3]), pt.x, pt.y);
+            }
+          });
+          done(null, tile);
+        });
+        return tile;
+      }
+    });
+
+    function drawFeature(ctx, f, toPx, layer) {
+      var geom = f.geometry;
+      var polys = geom.type === 'Polygon' ? [geom.coordinates]
+        : (geom.type === 'MultiPolygon' ? geom.coordinates : []);
+      ctx.beginPath();
+      polys.forEach(function(rings) {
+        rings.forEach(function(ring) {
+          ring.forEach(function(c, i) {
+            var pt = toPx(c[1], c[0]);
+            if (i === 0) ctx.moveTo(pt.x, pt.y); else ctx.lineTo(pt.x, pt.y);
+          });
+          ctx.closePath();
+        });
+      });
+      ctx.globalAlpha = layer === 'europe' ? 0.6 : 0.95;
+      ctx.fillStyle = f.properties.fill;
+      ctx.fill('evenodd');
+      ctx.globalAlpha = 1;
+      ctx.lineWidth = layer === 'europe' ? 1.5 : 1;
+      ctx.strokeStyle = layer === 'europe' ? '#333333' : '#555555';
+      ctx.stroke();
+    }
+
+    new ProjectTiles({ maxZoom: 19 }).addTo(map);
+
+    // Hit-Test gegen die geladenen Kachel-Daten an der Klickposition
+    map.on('click', function(e) {
+      var z = map.getZoom();
+      var nz = Math.min(z, META.maxZoom);
+      var tp = map.project(e.latlng, nz).divideBy(256).floor();
+      var data = loaded[tileKey(nz, tp.x, tp.y)];
+      if (!data || !data.projects) return;
+      var click = map.project(e.latlng, z);
+      var best = null, bestDist = Infinity;
+      data.projects.forEach(function(r) {
+        var isPoint = nz > META.clusterMaxZoom;
+        var lat = isPoint ? r[9] : r[0], lon = isPoint ? r[10] : r[1];
+        var d = map.project([lat, lon], z).distanceTo(click);
+        var radius = isPoint ? PIN / 2 : clusterRadius(r[3]);
+        if (d <= radius && d < bestDist) { best = { row: r, point: isPoint, lat: lat, lon: lon }; bestDist = d; }
+      });
+      if (!best) return;
+      if (best.point) {
+        L.popup({ maxWidth: 580 }).setLatLng([best.lat, best.lon])
+          .setContent(window.buildPopupHtml(pointRecord(best.row))).openOn(map);
+      } else {
+        map.setView([best.lat, best.lon], Math.min(z + 2, META.maxZoom));
+      }
+    });
+    """
+    js = (
+        js.replace("__META__", json.dumps(metadata, ensure_ascii=False))
+        .replace("__CATEGORY_COLOR__", json.dumps(CATEGORY_COLOR))
+        .replace("__STATUS_RING__", json.dumps(STATUS_RING_COLOR))
+        .replace("__PIN_SIZE__", str(PIN_SIZE))
+    )
+    return f"""<!DOCTYPE html>
+<html lang="de">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Projekte (Kacheln)</title>
+<link rel="stylesheet" href="{LEAFLET_CSS}">
+<script src="{LEAFLET_JS}"></script>
+<style>
+html, body, #map {{ height:100%; margin:0; }}
+#map {{ background:#ffffff; }}
+.popup {{ min-width:300px; font-size:14px; line-height:1.55; }}
+.popup h3 {{ margin:0 0 10px 0; font-size:17px; }}
+.popup .row {{ display:flex; gap:10px; margin:5px 0; }}
+.popup .k {{ width:140px; color:#495057; }}
+.badge {{ display:inline-block; padding:2px 10px; border-radius:999px; font-size:12px; font-weight:700; }}
+.badge.auftrag {{ background:#eafaf0; color:#1b5e20; }}
+.badge.angebot {{ background:#fff7e6; color:#8a5a00; }}
+</style>
+</head>
+<body>
+<div id="map"></div>
+{project_popup_js("map")}
+<script>
+{js}
+</script>
+</body>
+</html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportiert Projekte und Grenzen als Kachel-Pyramide")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Kacheln erzeugen (Ordner mit index.html oder MBTiles)")
+    export.add_argument("--out", help=f"Zielordner (Default: TILE_DIR bzw. {DEFAULT_TILE_DIR})")
+    export.add_argument("--mbtiles", help="Stattdessen in diese MBTiles-Datei schreiben")
+    export.add_argument("--max-zoom", type=int, default=CLUSTER_MAX_ZOOM,
+                        help=f"Letzte Cluster-Stufe, darüber Einzelprojekte (Default: {CLUSTER_MAX_ZOOM})")
+    args = parser.parse_args()
+
+    geocode_cache = open_geocode_cache()
+    try:
+        # Generator -> vor dem Schließen des Caches vollständig geocodieren
+        records = list(iter_project_records(iter_project_frames(load_project_source(), geocode_cache)))
+    finally:
+        if geocode_cache is not None:
+            geocode_cache.close()
+
+    if args.mbtiles:
+        sink = MBTiles(Path(args.mbtiles).expanduser().resolve())
+        target = sink.path
+    else:
+        sink = DirectoryTiles(Path(args.out).expanduser().resolve() if args.out else get_tile_dir())
+        target = sink.out_dir
+
+    print(f"\n🧱 Kacheln: {target}")
+    metadata = export_tiles(records, sink, max_zoom=args.max_zoom)
+
+    if isinstance(sink, DirectoryTiles):
+        with open(sink.out_dir / "index.html", "w", encoding="utf-8") as f:
+            f.write(viewer_html(metadata))
+        print(f"✅ {metadata['tiles']} Kacheln, {metadata['projects']} Projekte - Viewer: {sink.out_dir / 'index.html'}")
+        print("   Über HTTP ausliefern (z.B. python -m http.server im Ordner), file:// blockiert fetch()")
+    else:
+        print(f"✅ {metadata['tiles']} Kacheln, {metadata['projects']} Projekte in {target}")
+        print("   Tile-Server muss /<z>/<x>/<y>.json aus der MBTiles-Datei liefern")
+
+
+if __name__ == "__main__":
+    main()